@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 
 from app.api.deps import get_current_user, get_rag_service
 from app.core.logging import setup_logging
 from app.schemas.chat import ChatRequest, ChatResponse
-from app.schemas.document import RefreshDataRequest, RefreshDataResponse
+from app.schemas.document import RefreshDataRequest, RefreshJobResponse
 from app.services.rag_service import RAGService
+from app.services.refresh_jobs import RefreshConflict
 
 logger = setup_logging()
 
@@ -32,6 +37,8 @@ async def chat(
             question=request.message,
             conversation_history=conversation_history,
             max_results=request.max_results or 5,
+            use_cache=request.use_cache is not False,
+            deadline_ms=request.deadline_ms,
         )
 
         return ChatResponse(**result)
@@ -41,22 +48,97 @@ async def chat(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/refresh", response_model=RefreshDataResponse)
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    rag_service: RAGService = Depends(get_rag_service),
+    current_user: str = Depends(get_current_user),
+):
+    """Handle chat requests, streaming the answer as Server-Sent Events"""
+    logger.info(f"Processing streaming chat request: {request.message[:100]}...")
+
+    conversation_history = []
+    if request.conversation_history:
+        conversation_history = [
+            {"role": msg.role, "content": msg.content}
+            for msg in request.conversation_history
+        ]
+
+    async def event_stream():
+        try:
+            async for event in rag_service.stream_query(
+                question=request.message,
+                conversation_history=conversation_history,
+                max_results=request.max_results or 5,
+                use_cache=request.use_cache is not False,
+                deadline_ms=request.deadline_ms,
+            ):
+                yield _format_sse(event)
+
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {e}")
+            yield _format_sse({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    """Serialize an event as a Server-Sent Events message"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.post("/refresh", response_model=RefreshJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def refresh_data(
     request: RefreshDataRequest,
     rag_service: RAGService = Depends(get_rag_service),
     current_user: str = Depends(get_current_user),
 ):
-    """Refresh knowledge base data"""
+    """Start a knowledge base refresh job, or join a running or queued one with the same options"""
     try:
         logger.info("Manual data refresh requested")
 
-        result = await rag_service.refresh_knowledge_base(
-            force_refresh=request.force_refresh
+        job, deduplicated = rag_service.refresh_jobs.submit(
+            force_refresh=request.force_refresh,
+            replay=request.replay
         )
 
-        return RefreshDataResponse(**result)
+        return RefreshJobResponse(**job.to_dict(), deduplicated=deduplicated)
 
+    except RefreshConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error in refresh endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/refresh/{job_id}", response_model=RefreshJobResponse)
+async def refresh_status(
+    job_id: str,
+    rag_service: RAGService = Depends(get_rag_service),
+    current_user: str = Depends(get_current_user),
+):
+    """Get the progress of a refresh job"""
+    job = rag_service.refresh_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+
+    return RefreshJobResponse(**job.to_dict())
+
+
+@router.delete("/refresh/{job_id}", response_model=RefreshJobResponse)
+async def cancel_refresh(
+    job_id: str,
+    rag_service: RAGService = Depends(get_rag_service),
+    current_user: str = Depends(get_current_user),
+):
+    """Cancel a running refresh job"""
+    job = await rag_service.refresh_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+
+    logger.info(f"Refresh job {job_id} cancel requested, state is now {job.state}")
+    return RefreshJobResponse(**job.to_dict())
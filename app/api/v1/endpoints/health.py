@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from typing import Any, Dict
+
+from fastapi import APIRouter, Response, status
 
 from app.schemas.chat import HealthResponse
 
@@ -6,15 +8,22 @@ router = APIRouter()
 
 
 @router.get("/", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint"""
+async def health_check(response: Response):
+    """Health check endpoint
+
+    Answers 503 when a component failed to load, so orchestrator health
+    checks (``curl -f``) mark the container unhealthy.
+    """
     try:
         from app.services.rag_service import rag_service
 
         health_status = await rag_service.get_health_status()
+        if health_status['status'] == 'error':
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
         return HealthResponse(**health_status)
 
     except Exception:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
         return HealthResponse(
             status="error",
             weaviate_ready=False,
@@ -22,3 +31,11 @@ async def health_check():
             document_count=0,
             last_updated=None,
         )
+
+
+@router.get("/metrics")
+async def metrics() -> Dict[str, Any]:
+    """Runtime metrics endpoint"""
+    from app.services.rag_service import rag_service
+
+    return await rag_service.get_metrics()
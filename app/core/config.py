@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import field_validator
 from pydantic_settings import BaseSettings
@@ -23,26 +23,96 @@ class Settings(BaseSettings):
     WEAVIATE_URL: str = "http://localhost:8080"
     WEAVIATE_API_KEY: Optional[str] = None
     WEAVIATE_CLASS_NAME: str = "ITSMDocument"
+    WEAVIATE_POOL_SIZE: int = 20
+    WEAVIATE_CONNECT_TIMEOUT: float = 5.0
+    WEAVIATE_TIMEOUT: float = 60.0
+    WEAVIATE_SEARCH_TIMEOUT: float = 10.0
+
+    VECTOR_STORE_BACKEND: str = "weaviate"
+    NUMPY_STORE_DIR: str = "./data/vector_store"
 
     HF_MODEL_NAME: str = "google/gemma-2-2b-it"
     HF_CACHE_DIR: str = "./models"
     HF_TOKEN: Optional[str] = None
     DEVICE: str = "cpu"  
+    GENERATION_BACKEND: str = "torch"
+    GENERATION_ONNX_DIR: str = "./models/onnx"
+    GENERATION_WORKERS: int = 1
+    STREAM_MAX_NEW_TOKENS: int = 512
+    GENERATION_BATCHING: bool = True
+    GENERATION_MAX_BATCH_SIZE: int = 4
+    GENERATION_MAX_WAIT_MS: float = 20.0
+    GENERATION_MAX_BATCH_TOKENS: int = 16384
+    GENERATION_PREFIX_CACHE: bool = True
+    GENERATION_DEADLINE_MS: float = 20000.0
+    GENERATION_INITIAL_TOKENS_PER_SECOND: float = 8.0
+    GENERATION_MIN_NEW_TOKENS: int = 32
+    GENERATION_SENTENCE_STOP_TOKENS: int = 256
+    GENERATION_STOP_MARKERS: List[str] = ["[QUESTION]", "[DOCUMENTS]", "[ANSWER]"]
 
 
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_FILE: Optional[str] = None
+    EMBEDDING_WORKERS: int = 2
+    TORCH_NUM_THREADS: int = 0
+    EMBEDDING_BATCH_WINDOW_MS: float = 3.0
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    QUERY_EMBEDDING_CACHE_TTL: int = 3600
+    EMBEDDING_STORE_ENABLED: bool = True
+    EMBEDDING_STORE_DIR: str = "./models/embeddings"
 
 
     TARGET_URL: str = "https://zenduty.com/blog/top-itsm-tools/"
     SCRAPING_TIMEOUT: int = 30
     SCRAPING_DELAY: float = 1.0
+    SCRAPING_HOST_CONCURRENCY: int = 2
+    SCRAPING_MAX_CONNECTIONS: int = 20
+    SCRAPING_PARSER: str = "html.parser"
     MAX_RETRIES: int = 3
+    CRAWL_SEED_URLS: List[str] = []
+    CRAWL_SITEMAP_URL: Optional[str] = None
+    CRAWL_MAX_PAGES: int = 200
+    FETCH_STATE_FILE: str = "./data/fetch_state.json"
+    SNAPSHOT_ENABLED: bool = True
+    SNAPSHOT_DIR: str = "./data/snapshots"
+    SNAPSHOT_KEEP: int = 3
 
 
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    INGEST_QUEUE_SIZE: int = 256
+    INGEST_PROCESS_CONCURRENCY: int = 2
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_EMBED_CONCURRENCY: int = 1
+    INGEST_WRITE_BATCH_SIZE: int = 64
+    INGEST_WRITE_CONCURRENCY: int = 2
     MAX_CHUNKS_PER_QUERY: int = 5
+    CONTEXT_TOKEN_BUDGET: int = 1024
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.8
+    CONTEXT_SHINGLE_SIZE: int = 5
+
+    RETRIEVAL_MODE: str = "hybrid"
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    BM25_INDEX_DIR: str = "./data/bm25"
+
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 30
+    RERANK_TOP_K: int = 3
+    RERANK_BUDGET_MS: float = 250.0
+    RERANK_BATCH_SIZE: int = 8
+    RERANK_WORKERS: int = 2
+    RERANK_CACHE_SIZE: int = 4096
+    RERANK_CACHE_TTL: int = 3600
+
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 256
+    ANSWER_CACHE_TTL: int = 3600
+    ANSWER_CACHE_THRESHOLD: float = 0.95
 
     DATA_REFRESH_HOURS: int = 24
     AUTO_REFRESH: bool = True
@@ -57,6 +127,36 @@ class Settings(BaseSettings):
             raise ValueError("WEAVIATE_URL must start with http:// or https://")
         return v
 
+    @field_validator("VECTOR_STORE_BACKEND")
+    def validate_vector_store_backend(cls, v):
+        if v not in ["weaviate", "numpy"]:
+            raise ValueError("VECTOR_STORE_BACKEND must be one of: weaviate, numpy")
+        return v
+
+    @field_validator("GENERATION_BACKEND")
+    def validate_generation_backend(cls, v):
+        if v not in ["torch", "int8", "onnx"]:
+            raise ValueError("GENERATION_BACKEND must be one of: torch, int8, onnx")
+        return v
+
+    @field_validator("EMBEDDING_BACKEND")
+    def validate_embedding_backend(cls, v):
+        if v not in ["torch", "int8", "onnx"]:
+            raise ValueError("EMBEDDING_BACKEND must be one of: torch, int8, onnx")
+        return v
+
+    @field_validator("SCRAPING_PARSER")
+    def validate_scraping_parser(cls, v):
+        if v not in ["html.parser", "lxml"]:
+            raise ValueError("SCRAPING_PARSER must be one of: html.parser, lxml")
+        return v
+
+    @field_validator("RETRIEVAL_MODE")
+    def validate_retrieval_mode(cls, v):
+        if v not in ["vector", "hybrid"]:
+            raise ValueError("RETRIEVAL_MODE must be one of: vector, hybrid")
+        return v
+
     @field_validator("DEVICE")
     def validate_device(cls, v):
         if v not in ["cpu", "cuda", "mps"]:
@@ -0,0 +1,186 @@
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.+#][a-z0-9]+)*")
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "which", "with", "does", "do", "can", "i", "me", "my", "vs",
+})
+RECORD_FIELDS = ("content", "source", "category", "tool_name", "section", "chunk_index", "tool_rank")
+
+
+class _IndexState:
+    """Immutable snapshot of the index so searches never see a half-built index"""
+
+    def __init__(self, terms, offsets, postings_docs, postings_tf, doc_lengths, ids, records):
+        self.terms: Dict[str, int] = terms
+        self.offsets: np.ndarray = offsets
+        self.postings_docs: np.ndarray = postings_docs
+        self.postings_tf: np.ndarray = postings_tf
+        self.doc_lengths: np.ndarray = doc_lengths
+        self.ids: List[str] = ids
+        self.records: List[Dict[str, Any]] = records
+
+        n = len(ids)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        self.avg_length = float(doc_lengths.mean()) if n else 1.0
+
+
+class BM25Index:
+    """Compact BM25 inverted index over chunk content
+
+    Postings for all terms live in two flat arrays (document index and term
+    frequency) addressed by per-term offsets, saved as one ``.npz`` file next
+    to a JSON file with the vocabulary and the chunk payloads.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75):
+        self.directory = Path(directory)
+        self.arrays_path = self.directory / "bm25.npz"
+        self.meta_path = self.directory / "bm25.json"
+        self.k1 = k1
+        self.b = b
+        self._state: Optional[_IndexState] = None
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+    def build(self, documents: List[Dict[str, Any]]):
+        """Index the full set of chunks, replacing the previous index"""
+        postings: Dict[str, List[tuple]] = {}
+        lengths = []
+
+        for position, doc in enumerate(documents):
+            tokens = self.tokenize(doc.get("content", ""))
+            lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                postings.setdefault(token, []).append((position, count))
+
+        terms = sorted(postings)
+        offsets = [0]
+        postings_docs = []
+        postings_tf = []
+        for term in terms:
+            for position, count in postings[term]:
+                postings_docs.append(position)
+                postings_tf.append(count)
+            offsets.append(len(postings_docs))
+
+        self._state = _IndexState(
+            terms={term: i for i, term in enumerate(terms)},
+            offsets=np.asarray(offsets, dtype=np.int64),
+            postings_docs=np.asarray(postings_docs, dtype=np.int32),
+            postings_tf=np.asarray(postings_tf, dtype=np.float32),
+            doc_lengths=np.asarray(lengths, dtype=np.float32),
+            ids=[doc.get("doc_id", "") for doc in documents],
+            records=[{field: doc.get(field, "") for field in RECORD_FIELDS} for doc in documents],
+        )
+        logger.info(f"Built BM25 index over {len(documents)} chunks and {len(terms)} terms")
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return the best matching chunks by BM25 score"""
+        state = self._state
+        if state is None or not state.ids:
+            return []
+
+        scores = np.zeros(len(state.ids), dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * state.doc_lengths / state.avg_length)
+
+        for token in set(self.tokenize(query)):
+            term = state.terms.get(token)
+            if term is None:
+                continue
+            start, end = state.offsets[term], state.offsets[term + 1]
+            docs = state.postings_docs[start:end]
+            tf = state.postings_tf[start:end]
+            scores[docs] += state.idf[term] * tf * (self.k1 + 1) / (tf + length_norm[docs])
+
+        matched = np.flatnonzero(scores > 0)
+        if matched.size == 0:
+            return []
+
+        k = min(limit, matched.size)
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {**state.records[i], "id": state.ids[i], "bm25_score": float(scores[i])}
+            for i in top
+        ]
+
+    def save(self):
+        """Persist the index atomically"""
+        state = self._state
+        if state is None:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        arrays_tmp = self.arrays_path.with_suffix(".tmp.npz")
+        np.savez(
+            arrays_tmp,
+            offsets=state.offsets,
+            postings_docs=state.postings_docs,
+            postings_tf=state.postings_tf,
+            doc_lengths=state.doc_lengths,
+        )
+        meta_tmp = self.meta_path.with_suffix(".tmp")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "terms": sorted(state.terms, key=state.terms.get),
+                "ids": state.ids,
+                "records": state.records,
+            }, f)
+
+        os.replace(arrays_tmp, self.arrays_path)
+        os.replace(meta_tmp, self.meta_path)
+
+    def load(self) -> bool:
+        """Load a persisted index; False if none exists"""
+        if not self.arrays_path.exists() or not self.meta_path.exists():
+            return False
+
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(self.arrays_path) as arrays:
+            self._state = _IndexState(
+                terms={term: i for i, term in enumerate(meta["terms"])},
+                offsets=arrays["offsets"],
+                postings_docs=arrays["postings_docs"],
+                postings_tf=arrays["postings_tf"],
+                doc_lengths=arrays["doc_lengths"],
+                ids=meta["ids"],
+                records=meta["records"],
+            )
+
+        logger.info(f"Loaded BM25 index with {len(self._state.ids)} chunks")
+        return True
+
+    def documents_for_sources(self, sources: Set[str]) -> List[Dict[str, Any]]:
+        """Indexed chunks of the given sources, in the shape ``build`` accepts"""
+        state = self._state
+        if state is None or not sources:
+            return []
+        return [
+            {**record, "doc_id": doc_id}
+            for doc_id, record in zip(state.ids, state.records)
+            if record.get("source") in sources
+        ]
+
+    def is_ready(self) -> bool:
+        return self._state is not None and bool(self._state.ids)
+
+    def __len__(self) -> int:
+        return len(self._state.ids) if self._state else 0
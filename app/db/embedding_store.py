@@ -0,0 +1,131 @@
+import hashlib
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+KEY_SIZE = 16
+
+
+class EmbeddingStore:
+    """Content-addressed embedding cache stored as a memory-mapped float32 matrix"""
+
+    def __init__(self, directory: str, model_key: str, dimension: int):
+        self.directory = Path(directory)
+        self.model_key = model_key
+        self.dimension = dimension
+
+        file_stem = f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model_key)}-{dimension}"
+        self.matrix_path = self.directory / f"{file_stem}.f32"
+        self.keys_path = self.directory / f"{file_stem}.keys"
+
+        self._index: Dict[bytes, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, text: str) -> bytes:
+        """Hash chunk text together with the model key"""
+        digest = hashlib.sha256(f"{self.model_key}\0{text}".encode("utf-8")).digest()
+        return digest[:KEY_SIZE]
+
+    def load(self):
+        """Load the key index and map the vector matrix"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.matrix_path.touch(exist_ok=True)
+        self.keys_path.touch(exist_ok=True)
+
+        row_bytes = self.dimension * 4
+        key_rows = self.keys_path.stat().st_size // KEY_SIZE
+        matrix_rows = self.matrix_path.stat().st_size // row_bytes
+        rows = min(key_rows, matrix_rows)
+
+        # A crash between the two appends leaves one file longer than the
+        # other; drop the unmatched tail so rows and keys stay aligned.
+        if self.keys_path.stat().st_size != rows * KEY_SIZE:
+            with open(self.keys_path, "r+b") as f:
+                f.truncate(rows * KEY_SIZE)
+        if self.matrix_path.stat().st_size != rows * row_bytes:
+            with open(self.matrix_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+
+        keys = self.keys_path.read_bytes()
+        self._index = {
+            keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(rows)
+        }
+        self._remap()
+
+        logger.info(f"Loaded embedding store with {rows} vectors from {self.matrix_path}")
+
+    def _remap(self):
+        """Re-open the memory map after the matrix file has grown"""
+        rows = len(self._index)
+        if rows == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(
+            self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dimension)
+        )
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Look up vectors by key, returning None for misses"""
+        with self._lock:
+            results = []
+            for key in keys:
+                row = self._index.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(np.array(self._matrix[row]))
+            return results
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]]):
+        """Append vectors for keys that are not stored yet"""
+        with self._lock:
+            new_keys = []
+            new_vectors = []
+            seen = set()
+            for key, vector in zip(keys, vectors):
+                if key in self._index or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_vectors.append(vector)
+
+            if not new_keys:
+                return
+
+            matrix = np.asarray(new_vectors, dtype=np.float32).reshape(-1, self.dimension)
+
+            # Vectors are written before keys so a key never points past
+            # the end of the matrix.
+            with open(self.matrix_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(new_keys))
+
+            start = len(self._index)
+            for offset, key in enumerate(new_keys):
+                self._index[key] = start + offset
+            self._remap()
+
+    def stats(self):
+        """Return store size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            'vectors': len(self._index),
+            'path': str(self.matrix_path),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+
+class FetchStateStore:
+    """HTTP validators (ETag, Last-Modified, body hash) of the last ingested fetch per URL
+
+    Fetches stage their validators first; they are only committed once the
+    refresh that consumed the page has succeeded, so a failed run is retried
+    in full next time instead of being skipped as unchanged.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable fetch state {self.path}: {e}")
+            self._state = {}
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            return self._state.get(url)
+
+    def stage(self, url: str, validators: Dict[str, Any]):
+        """Remember validators for a fetch until the refresh using it succeeds"""
+        with self._lock:
+            self._pending[url] = validators
+
+    def commit(self):
+        """Persist staged validators atomically"""
+        with self._lock:
+            if not self._pending:
+                return
+            self._load()
+            self._state.update(self._pending)
+            self._pending = {}
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def discard(self):
+        """Drop staged validators after a failed refresh"""
+        with self._lock:
+            self._pending = {}
@@ -0,0 +1,327 @@
+import asyncio
+import fnmatch
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+# Weaviate property names used in where filters mapped to document keys
+PROPERTY_KEYS = {
+    "toolName": "tool_name",
+    "chunkIndex": "chunk_index",
+    "toolRank": "tool_rank",
+    "contentHash": "content_hash",
+}
+
+RECORD_FIELDS = (
+    "content", "source", "category", "tool_name", "section",
+    "chunk_index", "tool_rank", "timestamp", "content_hash",
+)
+
+
+class NumpyVectorStore:
+    """In-process vector index with the same interface as WeaviateClient
+
+    Vectors are kept L2-normalized in one contiguous float32 matrix so a
+    search is a single matrix-vector product followed by ``argpartition``.
+    The matrix is a view over a buffer that grows geometrically, so adding
+    a batch does not copy the rows already stored. Writes only change the
+    in-memory index; ``flush`` saves it as ``.npy`` (memory-mapped on load)
+    once per refresh.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(directory or settings.NUMPY_STORE_DIR)
+        self.vectors_path = self.directory / "vectors.npy"
+        self.records_path = self.directory / "records.json"
+
+        self._buffer = np.zeros((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+        self._vectors = self._buffer
+        self._ids: List[str] = []
+        self._records: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._ready = False
+        self._save_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+        self._dirty = False
+        self._saves_in_flight = 0
+        self._shared_buffer: Optional[np.ndarray] = None
+
+    async def connect(self):
+        """Load the persisted index"""
+        try:
+            await asyncio.to_thread(self._load)
+            self._ready = True
+            logger.info(f"Loaded NumPy vector store with {len(self._ids)} documents")
+        except Exception as e:
+            logger.error(f"Failed to load NumPy vector store: {e}")
+            raise
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self.vectors_path.exists() or not self.records_path.exists():
+            return
+
+        with open(self.records_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        if vectors.shape[0] != len(data["ids"]):
+            logger.warning("NumPy vector store files are inconsistent, starting empty")
+            return
+
+        self._buffer = self._vectors = vectors
+        self._ids = data["ids"]
+        self._records = data["records"]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+
+    async def flush(self):
+        """Save the index if it changed since the last flush
+
+        The snapshot shares the matrix instead of copying it on the event
+        loop; until the save finishes, writes that would modify stored rows
+        in place copy the matrix first. Saves are serialized and a snapshot
+        older than the one already on disk is skipped.
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._version += 1
+        snapshot = (self._version, self._vectors, list(self._ids), list(self._records))
+
+        self._shared_buffer = self._buffer
+        self._saves_in_flight += 1
+        try:
+            await asyncio.to_thread(self._save, snapshot)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Error saving NumPy vector store: {e}")
+            raise
+        finally:
+            self._saves_in_flight -= 1
+            if not self._saves_in_flight:
+                self._shared_buffer = None
+
+    def _save(self, snapshot):
+        """Write the index atomically so a reader never sees half a file"""
+        version, vectors, ids, records = snapshot
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            vectors_tmp = self.vectors_path.with_suffix(".tmp.npy")
+            np.save(vectors_tmp, vectors)
+            records_tmp = self.records_path.with_suffix(".tmp")
+            with open(records_tmp, "w", encoding="utf-8") as f:
+                json.dump({"ids": ids, "records": records}, f)
+
+            os.replace(vectors_tmp, self.vectors_path)
+            os.replace(records_tmp, self.records_path)
+            self._saved_version = version
+
+    def _writable_vectors(self) -> np.ndarray:
+        """Copy a memory-mapped or snapshotted matrix into memory before mutating it"""
+        if isinstance(self._buffer, np.memmap) or self._buffer is self._shared_buffer:
+            self._buffer = self._vectors = np.array(self._vectors, dtype=np.float32)
+        return self._vectors
+
+    def _append_rows(self, rows: np.ndarray):
+        """Append rows, growing the buffer geometrically when it is full"""
+        size = self._vectors.shape[0]
+        needed = size + rows.shape[0]
+        if needed > self._buffer.shape[0] or isinstance(self._buffer, np.memmap):
+            buffer = np.empty((max(needed, 2 * size, 1024), rows.shape[1]), dtype=np.float32)
+            buffer[:size] = self._vectors
+            self._buffer = buffer
+        # Rows past the current size are not part of any snapshot being saved
+        self._buffer[size:needed] = rows
+        self._vectors = self._buffer[:needed]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    async def add_documents(self, documents: List[Dict[str, Any]]):
+        """Add or replace documents"""
+        try:
+            vectors = self._normalize(np.asarray(
+                [doc["vector"] for doc in documents], dtype=np.float32
+            ).reshape(len(documents), -1))
+
+            new_rows = []
+            for doc, vector in zip(documents, vectors):
+                doc_id = doc.get("doc_id") or str(uuid.uuid4())
+                record = {field: doc.get(field, "") for field in RECORD_FIELDS}
+                record["chunk_index"] = doc.get("chunk_index", 0)
+                record["tool_rank"] = doc.get("tool_rank", 0)
+
+                position = self._positions.get(doc_id)
+                if position is not None:
+                    self._writable_vectors()[position] = vector
+                    self._records[position] = record
+                else:
+                    self._positions[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._records.append(record)
+                    new_rows.append(vector)
+
+            if new_rows:
+                self._append_rows(np.stack(new_rows))
+
+            self._dirty = True
+            logger.info(f"Added {len(documents)} documents to NumPy vector store")
+
+        except Exception as e:
+            logger.error(f"Error adding documents to NumPy vector store: {e}")
+            raise
+
+    async def search(self,
+                     query_vector: List[float],
+                     limit: int = 5,
+                     where_filter: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Search documents by cosine similarity"""
+        try:
+            if not self._ids:
+                return []
+
+            query = self._normalize(np.asarray(query_vector, dtype=np.float32))
+            scores = np.asarray(self._vectors @ query)
+
+            candidates = np.arange(len(self._ids))
+            if where_filter:
+                predicate = self._compile_filter(where_filter)
+                candidates = np.flatnonzero(np.fromiter(
+                    (predicate(self._ids[i], record) for i, record in enumerate(self._records)),
+                    dtype=bool, count=len(self._records)
+                ))
+                if candidates.size == 0:
+                    return []
+
+            candidate_scores = scores[candidates]
+            k = min(limit, candidate_scores.size)
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            top = top[np.argsort(-candidate_scores[top])]
+
+            documents = []
+            for i in top:
+                position = int(candidates[i])
+                record = self._records[position]
+                cosine = float(candidate_scores[i])
+                documents.append({
+                    "id": self._ids[position],
+                    "content": record["content"],
+                    "source": record["source"],
+                    "category": record["category"],
+                    "tool_name": record["tool_name"],
+                    "section": record["section"],
+                    "chunk_index": record["chunk_index"],
+                    "tool_rank": record["tool_rank"],
+                    "certainty": (1 + cosine) / 2,
+                    "distance": 1 - cosine
+                })
+
+            return documents
+
+        except Exception as e:
+            logger.error(f"Error searching documents: {e}")
+            return []
+
+    def _compile_filter(self, where: Dict[str, Any]) -> Callable[[str, Dict[str, Any]], bool]:
+        """Turn a Weaviate-style where filter into a predicate over records"""
+        operator = where.get("operator")
+
+        if operator in ("And", "Or"):
+            operands = [self._compile_filter(operand) for operand in where.get("operands", [])]
+            combine = all if operator == "And" else any
+            return lambda doc_id, record: combine(op(doc_id, record) for op in operands)
+
+        path = where["path"][-1]
+        key = PROPERTY_KEYS.get(path, path)
+        value = next((v for k, v in where.items() if k.startswith("value")), None)
+
+        def field(doc_id: str, record: Dict[str, Any]):
+            return doc_id if key == "id" else record.get(key)
+
+        comparisons = {
+            "Equal": lambda a: a == value,
+            "NotEqual": lambda a: a != value,
+            "GreaterThan": lambda a: a is not None and a > value,
+            "GreaterThanEqual": lambda a: a is not None and a >= value,
+            "LessThan": lambda a: a is not None and a < value,
+            "LessThanEqual": lambda a: a is not None and a <= value,
+            "Like": lambda a: a is not None and fnmatch.fnmatchcase(str(a).lower(), str(value).lower()),
+            "IsNull": lambda a: (a in (None, "")) == bool(value),
+            "ContainsAny": lambda a: a in value if not isinstance(a, list) else bool(set(a) & set(value)),
+            "ContainsAll": lambda a: set(value) <= set(a if isinstance(a, list) else [a]),
+        }
+        if operator not in comparisons:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+
+        compare = comparisons[operator]
+        return lambda doc_id, record: compare(field(doc_id, record))
+
+    async def get_content_index(self) -> Dict[str, Dict[str, str]]:
+        """Get the content hash and source of every stored document, keyed by id"""
+        return {
+            doc_id: {'content_hash': record.get("content_hash", ""), 'source': record.get("source", "")}
+            for doc_id, record in zip(self._ids, self._records)
+        }
+
+    async def delete_documents(self, ids: List[str]):
+        """Delete documents by id"""
+        try:
+            remove = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+            if not remove:
+                return
+
+            keep = [i for i in range(len(self._ids)) if i not in remove]
+            self._buffer = self._vectors = np.ascontiguousarray(self._vectors[keep], dtype=np.float32)
+            self._ids = [self._ids[i] for i in keep]
+            self._records = [self._records[i] for i in keep]
+            self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+
+            self._dirty = True
+            logger.info(f"Deleted {len(remove)} documents from NumPy vector store")
+
+        except Exception as e:
+            logger.error(f"Error deleting documents: {e}")
+            raise
+
+    async def delete_all_documents(self):
+        """Delete all documents"""
+        try:
+            self._buffer = self._vectors = np.zeros((0, self._vectors.shape[1]), dtype=np.float32)
+            self._ids = []
+            self._records = []
+            self._positions = {}
+            self._dirty = True
+            logger.info("All documents deleted successfully")
+        except Exception as e:
+            logger.error(f"Error deleting documents: {e}")
+            raise
+
+    async def get_document_count(self) -> int:
+        """Get total number of documents"""
+        return len(self._ids)
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    async def close(self):
+        """Save pending changes and release the index"""
+        await self.flush()
+        self._ready = False
+        logger.info("NumPy vector store closed")
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+
+class SnapshotStore:
+    """Raw fetched pages, gzip-compressed on disk, keyed by URL and content hash
+
+    Each URL gets a directory named after the hash of the URL holding one
+    ``<content_hash>.html.gz`` per distinct body. A JSON manifest records
+    the headers and fetch time of every snapshot and which one is the
+    latest, so ingestion can be replayed without network access.
+    """
+
+    def __init__(self, directory: str, keep: int = 3):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / "manifest.json"
+        self.keep = max(1, keep)
+        self._manifest: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.manifest_path.exists():
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot manifest {self.manifest_path}: {e}")
+            self._manifest = {}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _page_dir(self, url: str) -> Path:
+        return self.directory / hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+    def save(self, url: str, html: str, headers: Optional[Dict[str, str]] = None) -> str:
+        """Store a fetched page; returns its content hash"""
+        body = html.encode("utf-8")
+        content_hash = hashlib.sha256(body).hexdigest()
+
+        with self._lock:
+            self._load()
+            entry = self._manifest.setdefault(url, {'latest': None, 'snapshots': {}})
+            page_dir = self._page_dir(url)
+            path = page_dir / f"{content_hash}.html.gz"
+
+            if not path.exists():
+                page_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp")
+                # mtime=0 keeps the file bytes a pure function of the page
+                with gzip.GzipFile(tmp_path, "wb", mtime=0) as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+
+            entry['snapshots'].pop(content_hash, None)
+            entry['snapshots'][content_hash] = {
+                'fetched_at': time.time(),
+                'headers': dict(headers or {}),
+                'size': len(body),
+                'compressed_size': path.stat().st_size
+            }
+            entry['latest'] = content_hash
+            self._prune(url, entry)
+            self._save_manifest()
+
+        return content_hash
+
+    def _prune(self, url: str, entry: Dict[str, Any]):
+        """Drop the oldest snapshots of a URL beyond ``keep``"""
+        while len(entry['snapshots']) > self.keep:
+            oldest = next(iter(entry['snapshots']))
+            del entry['snapshots'][oldest]
+            (self._page_dir(url) / f"{oldest}.html.gz").unlink(missing_ok=True)
+
+    def latest(self, url: str) -> Optional[Dict[str, Any]]:
+        """The latest snapshot of a URL with its HTML, or None"""
+        with self._lock:
+            self._load()
+            entry = self._manifest.get(url)
+            if not entry or not entry.get('latest'):
+                return None
+            content_hash = entry['latest']
+            meta = dict(entry['snapshots'][content_hash])
+
+        path = self._page_dir(url) / f"{content_hash}.html.gz"
+        try:
+            with gzip.open(path, "rb") as f:
+                html = f.read().decode("utf-8")
+        except FileNotFoundError:
+            logger.warning(f"Snapshot file missing for {url}: {path}")
+            return None
+
+        return {'url': url, 'content_hash': content_hash, 'html': html, **meta}
+
+    def urls(self) -> List[str]:
+        with self._lock:
+            self._load()
+            return [url for url, entry in self._manifest.items() if entry.get('latest')]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            snapshots = [meta for entry in self._manifest.values() for meta in entry['snapshots'].values()]
+        return {
+            'urls': len(self._manifest),
+            'snapshots': len(snapshots),
+            'size': sum(meta['size'] for meta in snapshots),
+            'compressed_size': sum(meta['compressed_size'] for meta in snapshots)
+        }
@@ -0,0 +1,14 @@
+from app.core.config import settings
+
+
+def create_vector_store():
+    """Create the vector store backend selected by VECTOR_STORE_BACKEND"""
+    if settings.VECTOR_STORE_BACKEND == "numpy":
+        from app.db.numpy_store import NumpyVectorStore
+        return NumpyVectorStore()
+
+    from app.db.weaviate_client import weaviate_client
+    return weaviate_client
+
+
+vector_store = create_vector_store()
@@ -1,50 +1,115 @@
-import weaviate
+import json
+import httpx
 from typing import Dict, List, Any, Optional
 from app.core.config import settings
 from app.core.logging import setup_logging
 
 logger = setup_logging()
 
+CONTENT_HASH_PROPERTY = {
+    "name": "contentHash",
+    "dataType": ["string"],
+    "description": "Hash of the chunk content and metadata"
+}
+
+SEARCH_PROPERTIES = [
+    "content",
+    "source",
+    "category",
+    "toolName",
+    "section",
+    "chunkIndex",
+    "toolRank"
+]
+
+
+def _graphql_value(key: str, value: Any) -> str:
+    """Render a where-filter value as a GraphQL input literal"""
+    if key == "operator":
+        return value
+    if isinstance(value, dict):
+        fields = ", ".join(f"{k}: {_graphql_value(k, v)}" for k, v in value.items())
+        return "{" + fields + "}"
+    if isinstance(value, list):
+        return "[" + ", ".join(_graphql_value(key, item) for item in value) + "]"
+    return json.dumps(value)
+
+
+class WeaviateError(Exception):
+    """Raised when Weaviate rejects a request"""
+
+
 class WeaviateClient:
+    """Non-blocking Weaviate client over a pooled keep-alive HTTP connection set"""
+
     def __init__(self):
-        self.client = None
+        self.client: Optional[httpx.AsyncClient] = None
         self.class_name = settings.WEAVIATE_CLASS_NAME
-        
+
     async def connect(self):
         """Initialize Weaviate connection"""
         try:
-            auth_config = None
+            headers = {}
             if settings.WEAVIATE_API_KEY:
-                auth_config = weaviate.AuthApiKey(api_key=settings.WEAVIATE_API_KEY)
-            
-            self.client = weaviate.Client(
-                url=settings.WEAVIATE_URL,
-                auth_client_secret=auth_config,
-                timeout_config=(5, 60)
+                headers["Authorization"] = f"Bearer {settings.WEAVIATE_API_KEY}"
+
+            self.client = httpx.AsyncClient(
+                base_url=settings.WEAVIATE_URL,
+                headers=headers,
+                limits=httpx.Limits(
+                    max_connections=settings.WEAVIATE_POOL_SIZE,
+                    max_keepalive_connections=settings.WEAVIATE_POOL_SIZE
+                ),
+                timeout=httpx.Timeout(
+                    settings.WEAVIATE_TIMEOUT,
+                    connect=settings.WEAVIATE_CONNECT_TIMEOUT
+                )
             )
-            
-         
-            if self.client.is_ready():
+
+
+            response = await self.client.get("/v1/.well-known/ready")
+            if response.status_code == 200:
                 logger.info("Successfully connected to Weaviate")
                 await self._ensure_schema_exists()
             else:
-                raise Exception("Weaviate is not ready")
-                
+                raise WeaviateError("Weaviate is not ready")
+
         except Exception as e:
             logger.error(f"Failed to connect to Weaviate: {e}")
+            await self.close()
             raise
-    
+
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Send a request and return the decoded JSON body"""
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        response = await self.client.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise WeaviateError(f"{method} {path} failed with HTTP {response.status_code}: {response.text}")
+        if not response.content:
+            return None
+        return response.json()
+
+    async def _graphql(self, query: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run a GraphQL query and return its data"""
+        result = await self._request("POST", "/v1/graphql", json={"query": query}, timeout=timeout)
+        if result.get("errors"):
+            raise WeaviateError(f"GraphQL error: {result['errors']}")
+        return result.get("data", {})
+
     async def _ensure_schema_exists(self):
         """Ensure the required schema exists"""
         try:
-           
-            if not self.client.schema.exists(self.class_name):
+            response = await self.client.get(f"/v1/schema/{self.class_name}")
+
+            if response.status_code == 404:
                 logger.info(f"Creating Weaviate class: {self.class_name}")
-                
+
                 class_definition = {
                     "class": self.class_name,
                     "description": "ITSM knowledge documents",
-                    "vectorizer": "none",  
+                    "vectorizer": "none",
                     "properties": [
                         {
                             "name": "content",
@@ -85,27 +150,37 @@ class WeaviateClient:
                             "name": "timestamp",
                             "dataType": ["date"],
                             "description": "Creation timestamp"
-                        }
+                        },
+                        CONTENT_HASH_PROPERTY
                     ]
                 }
-                
-                self.client.schema.create_class(class_definition)
+
+                await self._request("POST", "/v1/schema", json=class_definition)
                 logger.info("Schema created successfully")
             else:
+                response.raise_for_status()
                 logger.info("Schema already exists")
-                
+                existing_class = response.json()
+                property_names = {prop["name"] for prop in existing_class.get("properties", [])}
+                if CONTENT_HASH_PROPERTY["name"] not in property_names:
+                    await self._request(
+                        "POST", f"/v1/schema/{self.class_name}/properties", json=CONTENT_HASH_PROPERTY
+                    )
+                    logger.info("Added contentHash property to existing schema")
+
         except Exception as e:
             logger.error(f"Error ensuring schema exists: {e}")
             raise
-    
+
     async def add_documents(self, documents: List[Dict[str, Any]]):
         """Add documents to Weaviate"""
         try:
-            with self.client.batch as batch:
-                batch.batch_size = 100
-                
-                for doc in documents:
-                    
+            batch_size = 100
+
+            for i in range(0, len(documents), batch_size):
+                objects = []
+                for doc in documents[i:i + batch_size]:
+
                     properties = {
                         "content": doc["content"],
                         "source": doc["source"],
@@ -114,101 +189,166 @@ class WeaviateClient:
                         "section": doc.get("section", ""),
                         "chunkIndex": doc.get("chunk_index", 0),
                         "toolRank": doc.get("tool_rank", 0),
-                        "timestamp": doc.get("timestamp", "")
+                        "timestamp": doc.get("timestamp", ""),
+                        "contentHash": doc.get("content_hash", "")
                     }
-                    
-                   
-                    batch.add_data_object(
-                        data_object=properties,
-                        class_name=self.class_name,
-                        vector=doc.get("vector")
-                    )
-            
+
+                    obj = {
+                        "class": self.class_name,
+                        "properties": properties,
+                        "vector": doc.get("vector")
+                    }
+                    if doc.get("doc_id"):
+                        obj["id"] = doc["doc_id"]
+                    objects.append(obj)
+
+                results = await self._request("POST", "/v1/batch/objects", json={"objects": objects})
+
+                errors = [
+                    item["result"]["errors"] for item in results or []
+                    if item.get("result", {}).get("errors")
+                ]
+                if errors:
+                    raise WeaviateError(f"{len(errors)} objects failed to import: {errors[0]}")
+
             logger.info(f"Added {len(documents)} documents to Weaviate")
-            
+
         except Exception as e:
             logger.error(f"Error adding documents to Weaviate: {e}")
             raise
-    
-    async def search(self, 
-                    query_vector: List[float], 
+
+    async def search(self,
+                    query_vector: List[float],
                     limit: int = 5,
                     where_filter: Optional[Dict] = None) -> List[Dict[str, Any]]:
         """Search documents by vector similarity"""
         try:
+            arguments = [
+                f"nearVector: {{vector: {json.dumps(list(query_vector))}}}",
+                f"limit: {int(limit)}"
+            ]
+            if where_filter:
+                arguments.append(f"where: {_graphql_value('where', where_filter)}")
+
             query = (
-                self.client.query
-                .get(self.class_name, [
-                    "content",
-                    "source",
-                    "category",
-                    "toolName",
-                    "section",
-                    "chunkIndex",
-                    "toolRank"
-                ])
-                .with_near_vector({"vector": query_vector})
-                .with_limit(limit)
-                .with_additional(["certainty", "distance"])
+                f"{{ Get {{ {self.class_name}({', '.join(arguments)}) {{ "
+                f"{' '.join(SEARCH_PROPERTIES)} _additional {{ id certainty distance }} }} }} }}"
             )
-            
-            if where_filter:
-                query = query.with_where(where_filter)
-            
-            result = query.do()
-            
+            data = await self._graphql(query, timeout=settings.WEAVIATE_SEARCH_TIMEOUT)
+
             documents = []
-            if "data" in result and "Get" in result["data"]:
-                for item in result["data"]["Get"][self.class_name]:
-                    documents.append({
-                        "content": item["content"],
-                        "source": item["source"],
-                        "category": item["category"],
-                        "tool_name": item["toolName"],
-                        "section": item["section"],
-                        "chunk_index": item["chunkIndex"],
-                        "tool_rank": item["toolRank"],
-                        "certainty": item["_additional"]["certainty"],
-                        "distance": item["_additional"]["distance"]
-                    })
-            
+            for item in data.get("Get", {}).get(self.class_name) or []:
+                documents.append({
+                    "id": item["_additional"]["id"],
+                    "content": item["content"],
+                    "source": item["source"],
+                    "category": item["category"],
+                    "tool_name": item["toolName"],
+                    "section": item["section"],
+                    "chunk_index": item["chunkIndex"],
+                    "tool_rank": item["toolRank"],
+                    "certainty": item["_additional"]["certainty"],
+                    "distance": item["_additional"]["distance"]
+                })
+
             return documents
-            
+
         except Exception as e:
             logger.error(f"Error searching documents: {e}")
             return []
-    
+
+    async def get_content_index(self) -> Dict[str, Dict[str, str]]:
+        """Get the content hash and source of every stored object, keyed by object id"""
+        try:
+            index = {}
+            cursor = None
+            page_size = 500
+
+            while True:
+                arguments = f"limit: {page_size}"
+                if cursor:
+                    arguments += f", after: {json.dumps(cursor)}"
+
+                data = await self._graphql(
+                    f"{{ Get {{ {self.class_name}({arguments}) {{ contentHash source _additional {{ id }} }} }} }}"
+                )
+                items = data.get("Get", {}).get(self.class_name) or []
+                for item in items:
+                    index[item["_additional"]["id"]] = {
+                        'content_hash': item.get("contentHash") or "",
+                        'source': item.get("source") or ""
+                    }
+
+                if len(items) < page_size:
+                    break
+                cursor = items[-1]["_additional"]["id"]
+
+            return index
+
+        except Exception as e:
+            logger.error(f"Error getting content index: {e}")
+            raise
+
+    async def delete_documents(self, ids: List[str]):
+        """Delete documents by object id"""
+        try:
+            batch_size = 1000
+            for i in range(0, len(ids), batch_size):
+                await self._request("DELETE", "/v1/batch/objects", json={
+                    "match": {
+                        "class": self.class_name,
+                        "where": {
+                            "path": ["id"],
+                            "operator": "ContainsAny",
+                            "valueTextArray": ids[i:i + batch_size]
+                        }
+                    },
+                    "output": "minimal"
+                })
+
+            logger.info(f"Deleted {len(ids)} documents from Weaviate")
+
+        except Exception as e:
+            logger.error(f"Error deleting documents: {e}")
+            raise
+
     async def delete_all_documents(self):
         """Delete all documents from the class"""
         try:
-            self.client.schema.delete_class(self.class_name)
+            await self._request("DELETE", f"/v1/schema/{self.class_name}")
             await self._ensure_schema_exists()
             logger.info("All documents deleted successfully")
         except Exception as e:
             logger.error(f"Error deleting documents: {e}")
             raise
-    
+
     async def get_document_count(self) -> int:
         """Get total number of documents"""
         try:
-            result = (
-                self.client.query
-                .aggregate(self.class_name)
-                .with_meta_count()
-                .do()
+            data = await self._graphql(
+                f"{{ Aggregate {{ {self.class_name} {{ meta {{ count }} }} }} }}",
+                timeout=settings.WEAVIATE_SEARCH_TIMEOUT
             )
-            
-            if "data" in result and "Aggregate" in result["data"]:
-                return result["data"]["Aggregate"][self.class_name][0]["meta"]["count"]
+
+            aggregate = data.get("Aggregate", {}).get(self.class_name) or []
+            if aggregate:
+                return aggregate[0]["meta"]["count"]
             return 0
-            
+
         except Exception as e:
             logger.error(f"Error getting document count: {e}")
             return 0
-    
-    def close(self):
+
+    def is_ready(self) -> bool:
+        return self.client is not None
+
+    async def flush(self):
+        """Writes are persisted by Weaviate as they happen"""
+
+    async def close(self):
         """Close Weaviate connection"""
         if self.client:
+            await self.client.aclose()
             self.client = None
             logger.info("Weaviate connection closed")
 
@@ -19,17 +19,14 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
    
     logger.info("Starting ITSM RAG AI Agent...")
-    try:
-        await rag_service.initialize()
-        logger.info("Application startup completed")
-    except Exception as e:
-        logger.error(f"Failed to initialize application: {e}")
-        raise
+    rag_service.start()
+    logger.info("Application startup completed, components are loading in the background")
     
     yield
     
     
     logger.info("Shutting down application...")
+    await rag_service.shutdown()
 
 
 app = FastAPI(
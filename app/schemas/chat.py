@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from pydantic import BaseModel
 
 class ChatMessage(BaseModel):
@@ -9,6 +9,8 @@ class ChatRequest(BaseModel):
     message: str
     conversation_history: Optional[List[ChatMessage]] = []
     max_results: Optional[int] = 5
+    use_cache: Optional[bool] = True
+    deadline_ms: Optional[float] = None
 
 class SourceInfo(BaseModel):
     source: str
@@ -22,6 +24,15 @@ class ChatResponse(BaseModel):
     sources: List[SourceInfo]
     confidence: float
     processing_time: float
+    cached: bool = False
+    truncated: bool = False
+
+class ComponentHealth(BaseModel):
+    stage: str
+    ready: bool
+    required: bool = True
+    elapsed: Optional[float] = None
+    error: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -29,3 +40,5 @@ class HealthResponse(BaseModel):
     model_ready: bool
     document_count: int
     last_updated: Optional[str] = None
+    components: Dict[str, ComponentHealth] = {}
+    ingestion: Dict[str, Any] = {}
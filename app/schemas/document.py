@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -24,9 +24,41 @@ class DocumentResponse(BaseModel):
 
 class RefreshDataRequest(BaseModel):
     force_refresh: Optional[bool] = False
+    replay: Optional[bool] = False
+
+class IngestStageStats(BaseModel):
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    items_per_second: float = 0.0
+    max_queue_depth: int = 0
 
 class RefreshDataResponse(BaseModel):
     status: str
     message: str
     documents_processed: int
+    documents_added: int = 0
+    documents_updated: int = 0
+    documents_deleted: int = 0
+    documents_unchanged: int = 0
     processing_time: float
+    stage_stats: Dict[str, IngestStageStats] = {}
+
+class RefreshStageProgress(BaseModel):
+    done: int = 0
+    total: int = 0
+    elapsed: float
+
+class RefreshJobResponse(BaseModel):
+    job_id: str
+    state: str
+    force_refresh: bool
+    replay: bool = False
+    stage: Optional[str] = None
+    stages: Dict[str, RefreshStageProgress] = {}
+    created_at: float
+    elapsed: float
+    result: Optional[RefreshDataResponse] = None
+    error: Optional[str] = None
+    deduplicated: bool = False
@@ -0,0 +1,111 @@
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+WORD = re.compile(r'\w+')
+
+
+class ContextPacker:
+    """Packs retrieved chunks into the prompt within a token budget
+
+    Chunks are taken in retrieval order. Sentences whose word shingles were
+    already covered by an earlier chunk (the CHUNK_OVERLAP region, repeated
+    tool blurbs) are dropped, a chunk that adds nothing new is skipped, and
+    the last chunk that fits is cut at a sentence boundary.
+    """
+
+    def __init__(self,
+                 tokenizer=None,
+                 token_budget: int = settings.CONTEXT_TOKEN_BUDGET,
+                 duplicate_threshold: float = settings.CONTEXT_DUPLICATE_THRESHOLD,
+                 shingle_size: int = settings.CONTEXT_SHINGLE_SIZE):
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return int(len(WORD.findall(text)) * 1.3) + 1
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _shingles(self, text: str) -> Set[Tuple[str, ...]]:
+        words = [word.lower() for word in WORD.findall(text)]
+        if len(words) < self.shingle_size:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def _is_covered(self, shingles: Set[Tuple[str, ...]], seen: Set[Tuple[str, ...]]) -> bool:
+        if not shingles:
+            return True
+        return len(shingles & seen) / len(shingles) >= self.duplicate_threshold
+
+    def pack(self, documents: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+        """Return (document, packed text) pairs that fit the token budget"""
+        packed = []
+        seen: Set[Tuple[str, ...]] = set()
+        used = 0
+        dropped = 0
+
+        for doc in documents:
+            header = self._header(len(packed) + 1, doc)
+            header_tokens = self.count_tokens(header)
+            if used + header_tokens >= self.token_budget:
+                break
+
+            sentences = []
+            sentence_shingles = []
+            for sentence in SENTENCE_BOUNDARY.split(doc.get('content', '')):
+                sentence = ' '.join(sentence.split())
+                if not sentence:
+                    continue
+                shingles = self._shingles(sentence)
+                if self._is_covered(shingles, seen):
+                    continue
+                sentences.append(sentence)
+                sentence_shingles.append(shingles)
+
+            if not sentences:
+                dropped += 1
+                continue
+
+            remaining = self.token_budget - used - header_tokens
+            kept = []
+            for sentence, shingles in zip(sentences, sentence_shingles):
+                tokens = self.count_tokens(sentence) + 1
+                if tokens > remaining:
+                    break
+                kept.append(sentence)
+                seen |= shingles
+                remaining -= tokens
+
+            if not kept:
+                break
+
+            text = ' '.join(kept)
+            packed.append((doc, text))
+            used = self.token_budget - remaining
+
+        if dropped:
+            logger.debug(f"Context packer dropped {dropped} duplicate chunks")
+        logger.debug(f"Packed {len(packed)} chunks into ~{used} of {self.token_budget} context tokens")
+
+        return packed
+
+    def render(self, documents: List[Dict[str, Any]]) -> str:
+        """Pack documents and render them as the prompt's document section"""
+        return '\n\n'.join(
+            f"{self._header(i, doc)}{text}"
+            for i, (doc, text) in enumerate(self.pack(documents), start=1)
+        )
+
+    @staticmethod
+    def _header(index: int, doc: Dict[str, Any]) -> str:
+        tool_name = doc.get('tool_name', 'Unknown')
+        category = doc.get('category', 'general')
+        return f"Source {index} ({tool_name} - {category}): "
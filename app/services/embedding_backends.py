@@ -0,0 +1,44 @@
+from typing import Optional
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+
+
+def load_embedding_model(model_name: str,
+                         backend: str,
+                         device: str = "cpu",
+                         cache_folder: Optional[str] = None,
+                         onnx_file: Optional[str] = None) -> SentenceTransformer:
+    """Load a SentenceTransformer on the requested backend
+
+    ``int8`` quantizes the transformer's linear layers dynamically in
+    PyTorch. ``onnx`` runs on ONNX Runtime through sentence-transformers
+    (needs the optional ``optimum[onnxruntime]`` package); ``onnx_file``
+    picks a pre-exported variant such as ``onnx/model_qint8_avx2.onnx``.
+    """
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(
+            model_name,
+            cache_folder=cache_folder,
+            device=device,
+            backend="onnx",
+            model_kwargs=model_kwargs
+        )
+
+    model = SentenceTransformer(model_name, cache_folder=cache_folder, device=device)
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+    return model
+
+
+def backend_key(model_name: str, backend: str, onnx_file: Optional[str] = None) -> str:
+    """Identify the vectors a model and backend produce, for caching"""
+    if backend == "torch":
+        return model_name
+    if backend == "onnx" and onnx_file:
+        return f"{model_name}-{backend}-{onnx_file}"
+    return f"{model_name}-{backend}"
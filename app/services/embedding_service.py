@@ -1,37 +1,96 @@
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Tuple
 import numpy as np
 import torch
-from sentence_transformers import SentenceTransformer
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.db.embedding_store import EmbeddingStore
+from app.services.embedding_backends import backend_key, load_embedding_model
+from app.utils.batcher import MicroBatcher
+from app.utils.cache import TTLCache
+from app.utils.executor import InstrumentedExecutor
 
 logger = setup_logging()
 
 class EmbeddingService:
     def __init__(self):
         self.model = None
+        self.store = None
         self.model_name = settings.EMBEDDING_MODEL
         self.device = settings.DEVICE
+        self.backend = settings.EMBEDDING_BACKEND
+        self.model_key = self.model_name
+        self.executor = InstrumentedExecutor("embedding", settings.EMBEDDING_WORKERS)
+        self.query_batcher = MicroBatcher(
+            self._encode_query_batch,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_WINDOW_MS
+        )
+        self.query_cache = TTLCache(
+            max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl_seconds=settings.QUERY_EMBEDDING_CACHE_TTL
+        )
         
     async def initialize(self):
         """Initialize the embedding model"""
         try:
             logger.info(f"Loading embedding model: {self.model_name}")
-            
-            self.model = SentenceTransformer(
-                self.model_name,
-                cache_folder=settings.HF_CACHE_DIR,
-                device=self.device
-            )
+
+            if settings.TORCH_NUM_THREADS > 0:
+                torch.set_num_threads(settings.TORCH_NUM_THREADS)
+
+            self.executor.start()
+            self.model = await self._load_model()
+            self.model_key = backend_key(self.model_name, self.backend, settings.EMBEDDING_ONNX_FILE)
             
           
-            test_embedding = self.model.encode(["test"], convert_to_tensor=False)
-            logger.info(f"Embedding model loaded successfully. Dimension: {len(test_embedding[0])}")
+            test_embedding = await self.executor.run(
+                self.model.encode, ["test"], convert_to_tensor=False
+            )
+            logger.info(
+                f"Embedding model loaded successfully ({self.backend} backend). "
+                f"Dimension: {len(test_embedding[0])}"
+            )
+
+            if settings.EMBEDDING_STORE_ENABLED:
+                self.store = EmbeddingStore(
+                    settings.EMBEDDING_STORE_DIR,
+                    model_key=self.model_key,
+                    dimension=len(test_embedding[0])
+                )
+                await self.executor.run(self.store.load)
             
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             raise
 
+    async def _load_model(self):
+        """Load the model on the configured backend, falling back to torch"""
+        if self.backend != "torch":
+            if self.device != "cpu":
+                logger.warning(f"The {self.backend} embedding backend runs on CPU only, using torch")
+            else:
+                try:
+                    return await self.executor.run(
+                        load_embedding_model,
+                        self.model_name,
+                        self.backend,
+                        device=self.device,
+                        cache_folder=settings.HF_CACHE_DIR,
+                        onnx_file=settings.EMBEDDING_ONNX_FILE
+                    )
+                except Exception as e:
+                    logger.warning(f"{self.backend} embedding backend unavailable, using torch: {e}")
+            self.backend = "torch"
+
+        return await self.executor.run(
+            load_embedding_model,
+            self.model_name,
+            "torch",
+            device=self.device,
+            cache_folder=settings.HF_CACHE_DIR
+        )
+
     async def encode_texts(self, texts: List[str]) -> List[List[float]]:
         """Encode texts into embeddings (batchwise)"""
         if not self.model:
@@ -39,19 +98,41 @@ class EmbeddingService:
         
         try:
             batch_size = 32
-            all_embeddings = []
+            all_embeddings: List[Any] = [None] * len(texts)
+            keys = []
+
+            if self.store:
+                keys = [self.store.make_key(text) for text in texts]
+                cached = await self.executor.run(self.store.get_many, keys)
+                for i, vector in enumerate(cached):
+                    if vector is not None:
+                        all_embeddings[i] = vector.tolist()
+
+            missing = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
             
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                embeddings = self.model.encode(
+            for start in range(0, len(missing), batch_size):
+                batch_indices = missing[start:start + batch_size]
+                batch = [texts[i] for i in batch_indices]
+                embeddings = await self.executor.run(
+                    self.model.encode,
                     batch,
                     convert_to_tensor=False,
                     show_progress_bar=False,
                     batch_size=batch_size
                 )
-                all_embeddings.extend(embeddings.tolist())
+
+                if self.store:
+                    await self.executor.run(
+                        self.store.put_many, [keys[i] for i in batch_indices], embeddings
+                    )
+
+                for i, embedding in zip(batch_indices, embeddings.tolist()):
+                    all_embeddings[i] = embedding
             
-            logger.info(f"Encoded {len(texts)} texts into embeddings")
+            logger.info(
+                f"Encoded {len(texts)} texts into embeddings "
+                f"({len(texts) - len(missing)} from embedding store)"
+            )
             return all_embeddings
             
         except Exception as e:
@@ -83,16 +164,53 @@ class EmbeddingService:
             raise RuntimeError("Embedding model not initialized")
         
         try:
-            embedding = self.model.encode([query], convert_to_tensor=False)[0]
-            return embedding.tolist()
+            cache_key = self._query_cache_key(query)
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+            embedding = await self.query_batcher.submit(query)
+            self.query_cache.set(cache_key, embedding)
+            return list(embedding)
             
         except Exception as e:
             logger.error(f"Error encoding query: {e}")
             raise
+
+    def _query_cache_key(self, query: str) -> Tuple[str, str]:
+        """Build a cache key from the model and backend and the normalized query text"""
+        normalized = re.sub(r'\s+', ' ', query).strip().lower()
+        return (self.model_key, normalized)
+
+    async def _encode_query_batch(self, queries: List[str]) -> List[List[float]]:
+        """Encode a batch of coalesced queries in one model call"""
+        embeddings = await self.executor.run(
+            self.model.encode,
+            queries,
+            convert_to_tensor=False,
+            show_progress_bar=False,
+            batch_size=len(queries)
+        )
+        return embeddings.tolist()
     
     def is_ready(self) -> bool:
         """Check if the embedding service is ready"""
         return self.model is not None
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Get embedding executor statistics"""
+        return {
+            'model': self.model_name,
+            'backend': self.backend,
+            'executor': self.executor.stats(),
+            'query_batching': self.query_batcher.stats(),
+            'query_cache': self.query_cache.stats(),
+            'embedding_store': self.store.stats() if self.store else None
+        }
+
+    def shutdown(self):
+        """Release the embedding executor"""
+        self.executor.shutdown()
+
 
 embedding_service = EmbeddingService()
@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import Optional
+
+import torch
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+GENERATION_BACKENDS = ("torch", "int8", "onnx")
+
+
+def quantize_int8(model):
+    """Quantize the model's linear layers to int8 with dynamic activation scales
+
+    Weights are converted once at load time; activations are quantized per
+    batch at runtime, so no calibration data is needed. CPU only.
+    """
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
+
+
+def onnx_export_dir(model_name: str, onnx_dir: str) -> Path:
+    return Path(onnx_dir) / model_name.strip("/").replace("/", "--")
+
+
+def load_onnx_model(model_name: str, onnx_dir: str, cache_dir: Optional[str] = None, token: Optional[str] = None):
+    """Load an ONNX Runtime causal LM with KV cache, exporting it on first use
+
+    Needs the optional ``optimum[onnxruntime]`` package. The export is kept
+    under ``onnx_dir`` so later starts skip the conversion.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError as e:
+        raise RuntimeError("The onnx generation backend requires optimum[onnxruntime]") from e
+
+    export_dir = onnx_export_dir(model_name, onnx_dir)
+    if (export_dir / "config.json").exists():
+        logger.info(f"Loading exported ONNX model from {export_dir}")
+        return ORTModelForCausalLM.from_pretrained(
+            export_dir, use_cache=True, provider="CPUExecutionProvider"
+        )
+
+    logger.info(f"Exporting {model_name} to ONNX, this only happens once")
+    model = ORTModelForCausalLM.from_pretrained(
+        model_name,
+        export=True,
+        use_cache=True,
+        provider="CPUExecutionProvider",
+        cache_dir=cache_dir,
+        token=token,
+    )
+    export_dir.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(export_dir)
+    return model
@@ -0,0 +1,145 @@
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from app.core.config import settings
+
+SENTENCE_END = re.compile(r'[.!?]["\')\]]?\s*$')
+
+# Reasons a response ended without being cut short by the budget; a
+# 'sentence' stop ends on a complete sentence, so it is not a truncation
+COMPLETE_REASONS = frozenset({'eos', 'marker', 'fallback', 'sentence'})
+
+# Reasons a response is a real model answer worth caching; 'fallback' is a
+# canned reply that must not outlive the failure that produced it
+CACHEABLE_REASONS = frozenset({'eos', 'marker', 'sentence'})
+
+
+class GenerationBudget:
+    """Decode limits for one request, checked after every generated token"""
+
+    def __init__(self,
+                 max_new_tokens: int,
+                 deadline: float,
+                 stop_markers: Sequence[str] = (),
+                 sentence_stop_tokens: int = 0):
+        self.max_new_tokens = max(1, max_new_tokens)
+        self.deadline = deadline
+        self.stop_markers = tuple(marker for marker in stop_markers if marker)
+        self.sentence_stop_tokens = sentence_stop_tokens
+
+    def marker_index(self, text: str) -> int:
+        """Position of the first stop marker in text, or -1"""
+        positions = [text.find(marker) for marker in self.stop_markers]
+        positions = [position for position in positions if position >= 0]
+        return min(positions) if positions else -1
+
+    def check(self, text: str, generated_tokens: int, now: Optional[float] = None) -> Optional[str]:
+        """Return why decoding should stop, or None to keep going"""
+        if self.marker_index(text) >= 0:
+            return 'marker'
+        if generated_tokens >= self.max_new_tokens:
+            return 'length'
+        if (now if now is not None else time.perf_counter()) >= self.deadline:
+            return 'deadline'
+        if (self.sentence_stop_tokens
+                and generated_tokens >= self.sentence_stop_tokens
+                and SENTENCE_END.search(text)):
+            return 'sentence'
+        return None
+
+    def trim(self, text: str) -> str:
+        """Cut text at the first stop marker, including a partial marker at the end
+
+        Applied to partial output as it streams, this holds back any tail
+        that may still grow into a marker.
+        """
+        index = self.marker_index(text)
+        if index >= 0:
+            return text[:index]
+
+        partial = max(
+            (size for marker in self.stop_markers for size in range(len(marker) - 1, 0, -1)
+             if text.endswith(marker[:size])),
+            default=0
+        )
+        return text[:-partial] if partial else text
+
+
+class BudgetController:
+    """Turns per-request latency deadlines into generation budgets
+
+    Decode throughput and time to first token are tracked as exponentially
+    weighted moving averages over finished requests, so the token budget
+    follows the model, hardware and batch load actually in use.
+    """
+
+    def __init__(self,
+                 default_deadline_ms: float = settings.GENERATION_DEADLINE_MS,
+                 initial_tokens_per_second: float = settings.GENERATION_INITIAL_TOKENS_PER_SECOND,
+                 min_new_tokens: int = settings.GENERATION_MIN_NEW_TOKENS,
+                 sentence_stop_tokens: int = settings.GENERATION_SENTENCE_STOP_TOKENS,
+                 stop_markers: Sequence[str] = tuple(settings.GENERATION_STOP_MARKERS),
+                 smoothing: float = 0.2,
+                 safety_factor: float = 0.9):
+        self.default_deadline_ms = default_deadline_ms
+        self.min_new_tokens = min_new_tokens
+        self.sentence_stop_tokens = sentence_stop_tokens
+        self.stop_markers = tuple(stop_markers)
+        self.smoothing = smoothing
+        self.safety_factor = safety_factor
+
+        self.tokens_per_second = initial_tokens_per_second
+        self.time_to_first_token = 0.0
+        self._lock = threading.Lock()
+
+        self.planned = 0
+        self.stop_reasons: Dict[str, int] = {}
+
+    def plan(self, max_new_tokens: int, deadline_ms: Optional[float] = None) -> GenerationBudget:
+        """Budget a request that must finish within deadline_ms from now"""
+        deadline_ms = deadline_ms or self.default_deadline_ms
+        now = time.perf_counter()
+
+        with self._lock:
+            decode_seconds = deadline_ms / 1000 - self.time_to_first_token
+            affordable = int(decode_seconds * self.tokens_per_second * self.safety_factor)
+            self.planned += 1
+
+        budget_tokens = min(max_new_tokens, max(self.min_new_tokens, affordable))
+        return GenerationBudget(
+            max_new_tokens=budget_tokens,
+            deadline=now + deadline_ms / 1000,
+            stop_markers=self.stop_markers,
+            sentence_stop_tokens=self.sentence_stop_tokens,
+        )
+
+    def observe(self,
+                generated_tokens: int,
+                decode_time: float,
+                time_to_first_token: Optional[float],
+                stop_reason: str):
+        """Fold a finished request's timings into the running estimates"""
+        with self._lock:
+            self.stop_reasons[stop_reason] = self.stop_reasons.get(stop_reason, 0) + 1
+            if generated_tokens > 1 and decode_time > 0:
+                rate = (generated_tokens - 1) / decode_time
+                self.tokens_per_second += self.smoothing * (rate - self.tokens_per_second)
+            if time_to_first_token is not None:
+                self.time_to_first_token += self.smoothing * (time_to_first_token - self.time_to_first_token)
+
+    @staticmethod
+    def is_truncated(stop_reason: str) -> bool:
+        return stop_reason not in COMPLETE_REASONS
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current throughput estimates and stop reason counts"""
+        with self._lock:
+            return {
+                'tokens_per_second': self.tokens_per_second,
+                'time_to_first_token_ms': self.time_to_first_token * 1000,
+                'default_deadline_ms': self.default_deadline_ms,
+                'planned': self.planned,
+                'stop_reasons': dict(self.stop_reasons),
+            }
@@ -0,0 +1,433 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import torch
+from transformers import DynamicCache
+
+from app.core.logging import setup_logging
+from app.services.generation_budget import GenerationBudget
+
+logger = setup_logging()
+
+
+class GenerationRequest:
+    """A prompt waiting for, or taking part in, batched decoding"""
+
+    def __init__(self, prompt_ids: List[int], budget: GenerationBudget, loop: asyncio.AbstractEventLoop):
+        self.prompt_ids = prompt_ids
+        self.budget = budget
+        self.loop = loop
+        self.events: asyncio.Queue = asyncio.Queue()
+
+        self.generated: List[int] = []
+        self.seen_tokens = set(prompt_ids)
+        self.emitted_text = ""
+        self.next_token: Optional[int] = None
+        self.cancelled = threading.Event()
+
+        self.submitted_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+
+    @property
+    def length(self) -> int:
+        return len(self.prompt_ids) + len(self.generated)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def emit(self, kind: str, payload: Any):
+        """Deliver an event to the waiting coroutine from the scheduler thread"""
+        self.loop.call_soon_threadsafe(self.events.put_nowait, (kind, payload))
+
+
+class GenerationScheduler:
+    """Continuous-batching decoder loop
+
+    Prompts are prefilled one at a time as they arrive and then join a shared
+    decode batch; every step feeds one token per active sequence through the
+    model together. Finished sequences leave the batch between steps and
+    their slots are refilled from the pending queue. Per-sequence KV caches
+    are left-padded to a common length and masked, the same layout
+    ``generate`` uses for batched left-padded prompts.
+    """
+
+    def __init__(self,
+                 model,
+                 tokenizer,
+                 max_batch_size: int = 4,
+                 max_wait_ms: float = 20.0,
+                 max_batch_tokens: int = 16384,
+                 temperature: float = 0.7,
+                 top_k: int = 50,
+                 repetition_penalty: float = 1.1,
+                 prefix_ids: Optional[List[int]] = None,
+                 prefix_cache=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_batch_tokens = max_batch_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.repetition_penalty = repetition_penalty
+        self.prefix_ids = prefix_ids or []
+        self.prefix_cache = prefix_cache
+
+        eos = getattr(model.generation_config, "eos_token_id", None) or tokenizer.eos_token_id
+        self.eos_token_ids = set(eos if isinstance(eos, list) else [eos])
+        self.device = model.device
+
+        self._pending: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._active: List[GenerationRequest] = []
+        self._cache = None
+        self._attention_mask: Optional[torch.Tensor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+        self._steps = 0
+        self._batched_tokens = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_queue_wait = 0.0
+
+    def start(self) -> bool:
+        """Check the model supports batched cache merging and start the decode thread"""
+        try:
+            with torch.inference_mode():
+                self._probe()
+        except Exception as e:
+            logger.warning(f"Continuous batching unavailable for this model, using per-request generation: {e}")
+            return False
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Generation scheduler started (max_batch_size={self.max_batch_size}, "
+            f"max_batch_tokens={self.max_batch_tokens})"
+        )
+        return True
+
+    def stop(self):
+        """Stop the decode thread"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, prompt_ids: List[int], budget: GenerationBudget) -> GenerationRequest:
+        """Queue a tokenized prompt; events arrive on the returned request"""
+        request = GenerationRequest(prompt_ids, budget, asyncio.get_running_loop())
+        self._pending.put(request)
+        return request
+
+    def _probe(self):
+        """Run two prompts of different lengths through prefill, merge and a padded decode step
+
+        Models whose cache or attention does not support the left-padded
+        batch layout fail here instead of on the first real requests.
+        """
+        token = self.tokenizer.eos_token_id or 0
+        prompts = [[token], self.prefix_ids + [token] if self.prefix_ids else [token] * 3]
+        try:
+            for prompt_ids in prompts:
+                _, cache = self._prefill(prompt_ids)
+                self._merge(None, cache)
+
+            logits = self._decode([token] * len(prompts))
+            if logits.shape[0] != len(prompts) or not torch.isfinite(logits).all():
+                raise RuntimeError(f"unexpected batched decode output of shape {tuple(logits.shape)}")
+        finally:
+            self._reset_batch()
+
+    def _run(self):
+        with torch.inference_mode():
+            while not self._stopped.is_set():
+                try:
+                    if not self._active:
+                        self._wait_for_batch()
+                    else:
+                        self._admit_pending()
+
+                    if self._active:
+                        self._step()
+
+                except Exception as e:
+                    logger.error(f"Generation scheduler step failed: {e}")
+                    for request in self._active:
+                        self._failed += 1
+                        request.emit('error', e)
+                    self._reset_batch()
+
+    def _wait_for_batch(self):
+        """Block until work arrives, then gather more arrivals for up to max_wait"""
+        try:
+            request = self._pending.get(timeout=0.5)
+        except queue.Empty:
+            return
+
+        self._admit(request)
+        deadline = time.perf_counter() + self.max_wait
+        while len(self._active) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if not self._admit(request):
+                break
+
+    def _admit_pending(self):
+        """Let queued requests join the running batch between steps"""
+        while len(self._active) < self.max_batch_size:
+            try:
+                request = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if not self._admit(request):
+                return
+
+    def _admit(self, request: GenerationRequest) -> bool:
+        """Prefill a request and merge it into the batch; False if it must wait"""
+        if request.cancelled.is_set():
+            return True
+
+        batch_tokens = sum(active.length for active in self._active)
+        if self._active and batch_tokens + len(request.prompt_ids) > self.max_batch_tokens:
+            # Put it back at the front of the line once the batch drains.
+            self._requeue(request)
+            return False
+
+        request.started_at = time.perf_counter()
+        self._total_queue_wait += request.started_at - request.submitted_at
+
+        try:
+            logits, cache = self._prefill(request.prompt_ids)
+        except Exception as e:
+            logger.error(f"Prefill failed: {e}")
+            self._failed += 1
+            request.emit('error', e)
+            return True
+
+        token = self._sample(logits, [request])[0]
+        if self._accept_token(request, token):
+            return True
+
+        self._merge(request, cache)
+        return True
+
+    def _requeue(self, request: GenerationRequest):
+        waiting = [request]
+        while True:
+            try:
+                waiting.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        for item in waiting:
+            self._pending.put(item)
+
+    def _prefill(self, prompt_ids: List[int]):
+        """Run the prompt through the model and return last-position logits and a legacy cache
+
+        When the prompt starts with the cached system prompt, only the tokens
+        after it are run, on top of the shared prefix cache.
+        """
+        cache = DynamicCache()
+        start = 0
+
+        prefix_length = len(self.prefix_ids)
+        if (self.prefix_cache is not None
+                and len(prompt_ids) > prefix_length
+                and prompt_ids[:prefix_length] == self.prefix_ids):
+            cache = DynamicCache.from_legacy_cache(self.prefix_cache)
+            start = prefix_length
+
+        input_ids = torch.tensor([prompt_ids[start:]], device=self.device)
+        outputs = self.model(
+            input_ids=input_ids,
+            past_key_values=cache,
+            use_cache=True,
+        )
+        return outputs.logits[:, -1, :], outputs.past_key_values.to_legacy_cache()
+
+    def _merge(self, request: Optional[GenerationRequest], cache):
+        """Left-pad the request cache or the batch cache so both share one length"""
+        new_length = cache[0][0].shape[2]
+        new_mask = torch.ones((1, new_length), dtype=torch.long, device=self.device)
+
+        if not self._active:
+            self._cache = cache
+            self._attention_mask = new_mask
+            self._active.append(request)
+            return
+
+        batch_length = self._attention_mask.shape[1]
+        target = max(batch_length, new_length)
+
+        merged = []
+        for (batch_k, batch_v), (new_k, new_v) in zip(self._cache, cache):
+            merged.append((
+                torch.cat([self._left_pad(batch_k, target), self._left_pad(new_k, target)], dim=0),
+                torch.cat([self._left_pad(batch_v, target), self._left_pad(new_v, target)], dim=0),
+            ))
+
+        self._cache = tuple(merged)
+        self._attention_mask = torch.cat([
+            self._left_pad_mask(self._attention_mask, target),
+            self._left_pad_mask(new_mask, target),
+        ], dim=0)
+        self._active.append(request)
+
+    @staticmethod
+    def _left_pad(tensor: torch.Tensor, length: int) -> torch.Tensor:
+        missing = length - tensor.shape[2]
+        if missing <= 0:
+            return tensor
+        padding = tensor.new_zeros((tensor.shape[0], tensor.shape[1], missing, tensor.shape[3]))
+        return torch.cat([padding, tensor], dim=2)
+
+    @staticmethod
+    def _left_pad_mask(mask: torch.Tensor, length: int) -> torch.Tensor:
+        missing = length - mask.shape[1]
+        if missing <= 0:
+            return mask
+        return torch.cat([mask.new_zeros((mask.shape[0], missing)), mask], dim=1)
+
+    def _step(self):
+        """Decode one token for every active sequence"""
+        logits = self._decode([request.next_token for request in self._active])
+        self._steps += 1
+        self._batched_tokens += len(self._active)
+
+        tokens = self._sample(logits, self._active)
+        keep = [
+            index for index, (request, token) in enumerate(zip(self._active, tokens))
+            if not self._accept_token(request, token)
+        ]
+
+        if len(keep) != len(self._active):
+            self._select_rows(keep)
+
+    def _decode(self, tokens: List[int]) -> torch.Tensor:
+        """Feed one token per batch row through the model; returns last-position logits"""
+        input_ids = torch.tensor([[token] for token in tokens], device=self.device)
+        attention_mask = torch.cat([
+            self._attention_mask,
+            self._attention_mask.new_ones((len(tokens), 1))
+        ], dim=1)
+        position_ids = attention_mask.sum(dim=1, keepdim=True) - 1
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=DynamicCache.from_legacy_cache(self._cache),
+            use_cache=True,
+        )
+        self._cache = outputs.past_key_values.to_legacy_cache()
+        self._attention_mask = attention_mask
+        return outputs.logits[:, -1, :]
+
+    def _select_rows(self, keep: List[int]):
+        """Drop finished sequences from the batch and trim shared left padding"""
+        if not keep:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(keep, device=self.device)
+        mask = self._attention_mask.index_select(0, index)
+        first_column = int(mask.any(dim=0).nonzero()[0])
+
+        self._attention_mask = mask[:, first_column:]
+        self._cache = tuple(
+            (k.index_select(0, index)[:, :, first_column:, :], v.index_select(0, index)[:, :, first_column:, :])
+            for k, v in self._cache
+        )
+        self._active = [self._active[i] for i in keep]
+
+    def _reset_batch(self):
+        self._active = []
+        self._cache = None
+        self._attention_mask = None
+
+    def _sample(self, logits: torch.Tensor, requests: List[GenerationRequest]) -> List[int]:
+        """Apply repetition penalty, temperature and top-k, then sample one token per row"""
+        logits = logits.float()
+
+        if self.repetition_penalty != 1.0:
+            for row, request in enumerate(requests):
+                seen = torch.tensor(list(request.seen_tokens), device=logits.device)
+                scores = logits[row, seen]
+                logits[row, seen] = torch.where(
+                    scores < 0, scores * self.repetition_penalty, scores / self.repetition_penalty
+                )
+
+        if self.temperature <= 0:
+            return logits.argmax(dim=-1).tolist()
+
+        logits = logits / self.temperature
+        if self.top_k:
+            top_values = torch.topk(logits, min(self.top_k, logits.shape[-1]), dim=-1).values
+            logits = logits.masked_fill(logits < top_values[:, -1:], float("-inf"))
+
+        probs = torch.softmax(logits, dim=-1)
+        return torch.multinomial(probs, num_samples=1).squeeze(1).tolist()
+
+    def _accept_token(self, request: GenerationRequest, token: int) -> bool:
+        """Record a sampled token and stream its text; True when the sequence is finished"""
+        now = time.perf_counter()
+        if token in self.eos_token_ids:
+            stop_reason = 'eos'
+        elif request.cancelled.is_set():
+            stop_reason = 'cancelled'
+        else:
+            request.generated.append(token)
+            request.seen_tokens.add(token)
+            request.next_token = token
+            if request.first_token_at is None:
+                request.first_token_at = now
+
+            text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+            stop_reason = request.budget.check(text, len(request.generated), now)
+
+            visible = request.budget.trim(text)
+            # Hold back a trailing partial multi-byte character until it completes.
+            if not visible.endswith("\ufffd") and len(visible) > len(request.emitted_text):
+                request.emit('token', visible[len(request.emitted_text):])
+                request.emitted_text = visible
+
+        if stop_reason is not None:
+            self._completed += 1
+            request.emit('done', {
+                'generated_tokens': len(request.generated),
+                'stop_reason': stop_reason,
+                'queue_wait': (request.started_at or now) - request.submitted_at,
+                'time_to_first_token': (request.first_token_at - request.submitted_at)
+                if request.first_token_at else None,
+                'decode_time': now - (request.first_token_at or now),
+            })
+
+        return stop_reason is not None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching statistics"""
+        admitted = self._completed + self._failed + len(self._active)
+        return {
+            'running': self.is_running(),
+            'active': len(self._active),
+            'pending': self._pending.qsize(),
+            'steps': self._steps,
+            'avg_batch_size': (self._batched_tokens / self._steps) if self._steps else 0.0,
+            'completed': self._completed,
+            'failed': self._failed,
+            'avg_queue_wait_ms': (self._total_queue_wait / admitted * 1000) if admitted else 0.0,
+        }
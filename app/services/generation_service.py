@@ -1,55 +1,155 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import torch
 from transformers import (
     AutoTokenizer, AutoModelForCausalLM, 
-    pipeline, BitsAndBytesConfig
+    BitsAndBytesConfig,
+    StoppingCriteria, StoppingCriteriaList, TextStreamer, DynamicCache
 )
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.services.context_packer import ContextPacker
+from app.services.generation_backends import load_onnx_model, quantize_int8
+from app.services.generation_budget import BudgetController, GenerationBudget
+from app.services.generation_scheduler import GenerationScheduler
+from app.utils.executor import InstrumentedExecutor
+import asyncio
 import os
 import re
+import threading
+import time
 
 logger = setup_logging()
 
+SYSTEM_PROMPT = """You are a helpful and knowledgeable assistant. Use only the information provided in the documents below to answer the user's question.create a conscise and complete answer based on the provided information. You are only allowed to answer questions that are within the domain of the documents provided.
+If the question is outside this domain, or the answer is not present in the documents, respond with: "I don't know".
+
+"""
+
+PROMPT_TEMPLATE = """[DOCUMENTS]
+{context}
+
+[QUESTION]
+{query}
+
+[ANSWER]"""
+
+
+class AsyncTextStreamer(TextStreamer):
+    """Streamer that hands decoded text from the generation thread to an asyncio queue"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, **decode_kwargs):
+        super().__init__(tokenizer, skip_prompt=True, **decode_kwargs)
+        self.loop = loop
+        self.queue = queue
+        self.token_count = 0
+
+    def put(self, value):
+        if not self.next_tokens_are_prompt:
+            self.token_count += value.numel()
+        super().put(value)
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+
+class BudgetCriteria(StoppingCriteria):
+    """Applies a GenerationBudget to model.generate and records why it stopped"""
+
+    def __init__(self, tokenizer, budget: GenerationBudget, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self.prompt_length = prompt_length
+        self.stop_reason: Optional[str] = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        generated = input_ids[0, self.prompt_length:]
+        text = self.tokenizer.decode(generated, skip_special_tokens=True)
+        self.stop_reason = self.budget.check(text, generated.shape[0])
+        return torch.full(
+            (input_ids.shape[0],), self.stop_reason is not None,
+            dtype=torch.bool, device=input_ids.device
+        )
+
+
+class CancelledCriteria(StoppingCriteria):
+    """Stops generation once the consumer has gone away"""
+
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full(
+            (input_ids.shape[0],), self.cancelled.is_set(),
+            dtype=torch.bool, device=input_ids.device
+        )
+
+
 class GenerationService:
     def __init__(self):
         self.model = None
         self.tokenizer = None
-        self.pipeline = None
+        self.scheduler = None
+        self.prefix_ids: List[int] = []
+        self.prefix_cache = None
+        self.context_packer = ContextPacker()
+        self.budget_controller = BudgetController()
         self.model_name = settings.HF_MODEL_NAME
         self.device = settings.DEVICE
         self.cache_dir = settings.HF_CACHE_DIR
+        self.backend = settings.GENERATION_BACKEND
+        self.executor = InstrumentedExecutor("generation", settings.GENERATION_WORKERS)
 
     async def initialize(self):
+        """Load the model in a worker thread, cache the prompt prefix and start batching"""
+        self.executor.start()
         try:
             logger.info(f"Loading generation model: {self.model_name}")
+            await self.executor.run(self._load_model)
+            logger.info(f"Generation model loaded successfully ({self.backend} backend)")
 
-            is_local_model = os.path.exists(self.model_name)
-            model_kwargs = {
-                "torch_dtype": torch.float16 if self.device == "cuda" else torch.float32,
-                "low_cpu_mem_usage": True,
-            }
-            if not is_local_model:
-                model_kwargs["cache_dir"] = self.cache_dir
-
-            if self.device == "cuda" and "large" in self.model_name.lower():
-                quantization_config = BitsAndBytesConfig(
-                    load_in_4bit=True,
-                    bnb_4bit_compute_dtype=torch.float16,
-                    bnb_4bit_use_double_quant=True,
-                    bnb_4bit_quant_type="nf4"
-                )
-                model_kwargs["quantization_config"] = quantization_config
-
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.model_name,
-                cache_dir=None if is_local_model else self.cache_dir,
-                use_auth_token=None if is_local_model else settings.HF_TOKEN
+        except Exception as e:
+            logger.error(f"Failed to load generation model: {e}")
+            self.backend = "torch"
+            await self.executor.run(self._load_fallback_model)
+
+        self.context_packer.tokenizer = self.tokenizer
+        await self._prepare_prefix_cache()
+        await self._start_scheduler()
+
+    def _load_model(self):
+        """Load the tokenizer and model on the configured backend"""
+        is_local_model = os.path.exists(self.model_name)
+        model_kwargs = {
+            "torch_dtype": torch.float16 if self.device == "cuda" else torch.float32,
+            "low_cpu_mem_usage": True,
+        }
+        if not is_local_model:
+            model_kwargs["cache_dir"] = self.cache_dir
+
+        if self.device == "cuda" and "large" in self.model_name.lower():
+            quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_quant_type="nf4"
             )
+            model_kwargs["quantization_config"] = quantization_config
 
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.model_name,
+            cache_dir=None if is_local_model else self.cache_dir,
+            use_auth_token=None if is_local_model else settings.HF_TOKEN
+        )
+
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
 
+        self.model = None
+        if self.backend == "onnx":
+            self.model = self._load_onnx_model(is_local_model)
+
+        if self.model is None:
             self.model = AutoModelForCausalLM.from_pretrained(
                 self.model_name,
                 use_auth_token=None if is_local_model else settings.HF_TOKEN,
@@ -59,21 +159,89 @@ class GenerationService:
             if self.device != "cpu" and not any("quantization_config" in str(k) for k in model_kwargs.keys()):
                 self.model = self.model.to(self.device)
 
-            self.pipeline = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if self.device == "cuda" else -1,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            if self.backend == "int8":
+                self.model = self._quantize_model(self.model)
+
+    def _load_onnx_model(self, is_local_model: bool):
+        """Load the ONNX Runtime model; None if it is unavailable"""
+        if self.device != "cpu":
+            logger.warning(f"The onnx generation backend runs on CPU only, using torch on {self.device}")
+            self.backend = "torch"
+            return None
+
+        try:
+            return load_onnx_model(
+                self.model_name,
+                settings.GENERATION_ONNX_DIR,
+                cache_dir=None if is_local_model else self.cache_dir,
+                token=None if is_local_model else settings.HF_TOKEN
             )
+        except Exception as e:
+            logger.warning(f"ONNX generation backend unavailable, using torch: {e}")
+            self.backend = "torch"
+            return None
 
-            logger.info("Generation model loaded successfully")
+    def _quantize_model(self, model):
+        """Apply dynamic int8 quantization; the float model is kept if it fails"""
+        if self.device != "cpu":
+            logger.warning(f"The int8 generation backend runs on CPU only, using torch on {self.device}")
+            self.backend = "torch"
+            return model
 
+        try:
+            return quantize_int8(model)
         except Exception as e:
-            logger.error(f"Failed to load generation model: {e}")
-            await self._load_fallback_model()
+            logger.warning(f"Int8 quantization failed, using float32 weights: {e}")
+            self.backend = "torch"
+            return model
+
+    async def _prepare_prefix_cache(self):
+        """Run prefill over the shared system prompt once and keep its KV cache"""
+        self.prefix_ids = self.tokenizer(SYSTEM_PROMPT)["input_ids"]
+        self.prefix_cache = None
 
-    async def _load_fallback_model(self):
+        # ONNX Runtime keeps its KV cache inside the session, not as torch tensors.
+        if not settings.GENERATION_PREFIX_CACHE or self.backend == "onnx":
+            return
+
+        try:
+            self.prefix_cache = await self.executor.run(self._compute_prefix_cache)
+            logger.info(f"Cached system prompt prefix ({len(self.prefix_ids)} tokens)")
+        except Exception as e:
+            logger.warning(f"Could not cache the system prompt prefix: {e}")
+
+    def _compute_prefix_cache(self):
+        with torch.inference_mode():
+            input_ids = torch.tensor([self.prefix_ids], device=self.model.device)
+            outputs = self.model(input_ids=input_ids, past_key_values=DynamicCache(), use_cache=True)
+            return outputs.past_key_values.to_legacy_cache()
+
+    def _has_cached_prefix(self, prompt_ids: List[int]) -> bool:
+        prefix_length = len(self.prefix_ids)
+        return (
+            self.prefix_cache is not None
+            and len(prompt_ids) > prefix_length
+            and prompt_ids[:prefix_length] == self.prefix_ids
+        )
+
+    async def _start_scheduler(self):
+        """Start continuous batching for the loaded model when enabled"""
+        if not settings.GENERATION_BATCHING or self.backend == "onnx":
+            return
+
+        scheduler = GenerationScheduler(
+            self.model,
+            self.tokenizer,
+            max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+            max_wait_ms=settings.GENERATION_MAX_WAIT_MS,
+            max_batch_tokens=settings.GENERATION_MAX_BATCH_TOKENS,
+            prefix_ids=self.prefix_ids,
+            prefix_cache=self.prefix_cache,
+        )
+        if await self.executor.run(scheduler.start):
+            self.scheduler = scheduler
+
+    def _load_fallback_model(self):
         try:
             logger.info("Loading fallback model: microsoft/DialoGPT-small")
 
@@ -91,79 +259,251 @@ class GenerationService:
                 torch_dtype=torch.float32
             )
 
-            self.pipeline = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=-1,
-            )
-
             logger.info("Fallback model loaded successfully")
 
         except Exception as e:
             logger.error(f"Failed to load fallback model: {e}")
             raise
 
+    async def warm_up(self, max_new_tokens: int = 8):
+        """Run a short generation so the first request does not pay for lazy initialization
+
+        The timings also seed the budget controller's throughput estimate.
+        """
+        started = time.perf_counter()
+        prompt_ids = self._encode_prompt("What is ITSM?", "Source 1 (ITSM - general): IT service management.")
+        budget = self.budget_controller.plan(max_new_tokens)
+
+        generated_tokens = 0
+        async for kind, payload in self._stream_tokens(prompt_ids, budget):
+            if kind == 'done':
+                generated_tokens = payload['generated_tokens']
+
+        logger.info(f"Generation warm-up produced {generated_tokens} tokens in {time.perf_counter() - started:.2f}s")
+
     async def generate_response(self, 
                               query: str, 
                               context_documents: List[Dict[str, Any]],
                               conversation_history: Optional[List[Dict[str, str]]] = None,
-                              max_length: int = 8019) -> str:
-        if not self.pipeline:
+                              max_length: int = 8019,
+                              deadline_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Generate an answer within the latency deadline
+
+        Returns the cleaned response, whether it was cut short by the
+        generation budget, and the reason decoding stopped.
+        """
+        if self.model is None:
             raise RuntimeError("Generation model not initialized")
 
         try:
             logger.info(f"Retrieved context documents: {context_documents}")
             context = self._prepare_context(context_documents)
             prompt = self._build_prompt(query, context, conversation_history)
+            prompt_ids = self._encode_prompt(query, context, conversation_history)
+            budget = self.budget_controller.plan(max_length - len(prompt_ids), deadline_ms)
+
+            parts = []
+            stop_reason = 'eos'
+            async for kind, payload in self._stream_tokens(prompt_ids, budget):
+                if kind == 'token':
+                    parts.append(payload)
+                else:
+                    stop_reason = payload['stop_reason']
+            generated_text = budget.trim(''.join(parts))
 
-            result = self.pipeline(
-                prompt,
-                max_length=max_length,
-                num_return_sequences=1,
-                temperature=0.7,
-                do_sample=True,
-                pad_token_id=self.tokenizer.pad_token_id,
-                eos_token_id=self.tokenizer.eos_token_id,
-                repetition_penalty=1.1,
-                length_penalty=1.0,
-            )
-
-            generated_text = result[0]['generated_text']
             response = self._extract_response(generated_text, prompt)
 
-            logger.info(f"Generated response for query: {query[:50]}...")
-            return response
+            logger.info(f"Generated response for query: {query[:50]}... (stopped on {stop_reason})")
+            return {
+                'response': response,
+                'truncated': self.budget_controller.is_truncated(stop_reason),
+                'stop_reason': stop_reason
+            }
 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return self._generate_fallback_response(query, context_documents)
+            return {
+                'response': self._generate_fallback_response(query, context_documents),
+                'truncated': False,
+                'stop_reason': 'fallback'
+            }
 
-    def _prepare_context(self, documents: List[Dict[str, Any]]) -> str:
-        context_parts = []
+    async def stream_response(self,
+                              query: str,
+                              context_documents: List[Dict[str, Any]],
+                              conversation_history: Optional[List[Dict[str, str]]] = None,
+                              max_new_tokens: int = settings.STREAM_MAX_NEW_TOKENS,
+                              deadline_ms: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Generate a response and yield text as the model produces it
+
+        Yields ``token`` events with the decoded text and finishes with a
+        ``done`` event carrying the cleaned response and decode statistics.
+        """
+        if self.model is None:
+            raise RuntimeError("Generation model not initialized")
 
-        for i, doc in enumerate(documents[:5]):
-            tool_name = doc.get('tool_name', 'Unknown')
-            category = doc.get('category', 'general')
-            content = doc.get('content', '')
-            context_parts.append(f"Source {i+1} ({tool_name} - {category}): {content}")
+        context = self._prepare_context(context_documents)
+        prompt = self._build_prompt(query, context, conversation_history)
+        prompt_ids = self._encode_prompt(query, context, conversation_history)
+        budget = self.budget_controller.plan(max_new_tokens, deadline_ms)
 
-        return '\n\n'.join(context_parts)
+        start_time = time.perf_counter()
+        first_token_time = None
+        generated_tokens = 0
+        stop_reason = 'eos'
+        parts = []
+
+        try:
+            async for kind, payload in self._stream_tokens(prompt_ids, budget):
+                if kind == 'done':
+                    generated_tokens = payload['generated_tokens']
+                    stop_reason = payload['stop_reason']
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                parts.append(payload)
+                yield {'type': 'token', 'text': payload}
+
+            response = self._extract_response(budget.trim(''.join(parts)), prompt)
+
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            stop_reason = 'error'
+            if parts:
+                response = ''.join(parts).strip()
+            else:
+                stop_reason = 'fallback'
+                response = self._generate_fallback_response(query, context_documents)
+                yield {'type': 'token', 'text': response}
+
+        total_time = time.perf_counter() - start_time
+        decode_time = (time.perf_counter() - first_token_time) if first_token_time else 0.0
+
+        yield {
+            'type': 'done',
+            'response': response,
+            'truncated': self.budget_controller.is_truncated(stop_reason),
+            'stop_reason': stop_reason,
+            'generated_tokens': generated_tokens,
+            'time_to_first_token': (first_token_time - start_time) if first_token_time else None,
+            'tokens_per_second': (generated_tokens / decode_time) if decode_time > 0 else 0.0,
+            'generation_time': total_time,
+        }
+
+    def _batching_enabled(self) -> bool:
+        return self.scheduler is not None and self.scheduler.is_running()
+
+    async def _stream_tokens(self, prompt_ids: List[int], budget: GenerationBudget) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield ('token', text) pairs followed by one ('done', stats) pair
+
+        Timings of every finished request feed the budget controller.
+        """
+        if self._batching_enabled():
+            stream = self._stream_with_scheduler(prompt_ids, budget)
+        else:
+            stream = self._stream_with_streamer(prompt_ids, budget)
+
+        start_time = time.perf_counter()
+        first_token_time = None
+        async for kind, payload in stream:
+            if kind == 'token' and first_token_time is None:
+                first_token_time = time.perf_counter()
+            if kind == 'done':
+                self.budget_controller.observe(
+                    payload['generated_tokens'],
+                    (time.perf_counter() - first_token_time) if first_token_time else 0.0,
+                    (first_token_time - start_time) if first_token_time else None,
+                    payload['stop_reason']
+                )
+            yield kind, payload
+
+    async def _stream_with_scheduler(self, prompt_ids: List[int], budget: GenerationBudget) -> AsyncIterator[Tuple[str, Any]]:
+        """Decode through the continuous-batching scheduler"""
+        request = self.scheduler.submit(prompt_ids, budget)
+        try:
+            while True:
+                kind, payload = await request.events.get()
+                if kind == 'error':
+                    raise payload
+                yield kind, payload
+                if kind == 'done':
+                    return
+        finally:
+            request.cancel()
+
+    async def _stream_with_streamer(self, prompt_ids: List[int], budget: GenerationBudget) -> AsyncIterator[Tuple[str, Any]]:
+        """Decode with model.generate on the generation executor"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        streamer = AsyncTextStreamer(self.tokenizer, loop, queue, skip_special_tokens=True)
+        budget_criteria = BudgetCriteria(self.tokenizer, budget, len(prompt_ids))
+        input_ids = torch.tensor([prompt_ids], device=self.model.device)
+
+        generate_kwargs = {}
+        if self._has_cached_prefix(prompt_ids):
+            # generate() only prefills the tokens past the end of the cache;
+            # updates concatenate into new tensors so the shared prefix is untouched.
+            generate_kwargs['past_key_values'] = DynamicCache.from_legacy_cache(self.prefix_cache)
+
+        generation = asyncio.ensure_future(self.executor.run(
+            self.model.generate,
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            streamer=streamer,
+            max_new_tokens=budget.max_new_tokens,
+            temperature=0.7,
+            do_sample=True,
+            pad_token_id=self.tokenizer.pad_token_id,
+            eos_token_id=self.tokenizer.eos_token_id,
+            repetition_penalty=1.1,
+            stopping_criteria=StoppingCriteriaList([CancelledCriteria(cancelled), budget_criteria]),
+            **generate_kwargs,
+        ))
+        # The future completes after the last streamer callback was queued,
+        # so the sentinel always arrives behind the final piece of text.
+        generation.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            text = ""
+            emitted = 0
+            while True:
+                piece = await queue.get()
+                if piece is None:
+                    break
+                # Stream only what survives the final trim: nothing from a stop
+                # marker on, and no tail that may still become one.
+                text += piece
+                visible = budget.trim(text)
+                if len(visible) > emitted:
+                    yield 'token', visible[emitted:]
+                    emitted = len(visible)
+
+            await generation
+            yield 'done', {
+                'generated_tokens': streamer.token_count,
+                'stop_reason': budget_criteria.stop_reason or 'eos'
+            }
+
+        finally:
+            cancelled.set()
+
+    def _prepare_context(self, documents: List[Dict[str, Any]]) -> str:
+        """Pack retrieved chunks into the context token budget"""
+        return self.context_packer.render(documents)
 
     def _build_prompt(self, 
                      query: str, 
                      context: str, 
                      conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
-        system_prompt = """You are a helpful and knowledgeable assistant. Use only the information provided in the documents below to answer the user's question.create a conscise and complete answer based on the provided information. You are only allowed to answer questions that are within the domain of the documents provided.
-        If the question is outside this domain, or the answer is not present in the documents, respond with: "I don't know".
-    
-[DOCUMENTS]
-{context}
+        return SYSTEM_PROMPT + self._build_prompt_suffix(query, context, conversation_history)
 
-[QUESTION]
-{query}
-
-[ANSWER]"""
+    def _build_prompt_suffix(self,
+                             query: str,
+                             context: str,
+                             conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Build the per-request part of the prompt that follows the shared system prompt"""
+        suffix = PROMPT_TEMPLATE.format(context=context, query=query)
 
         if conversation_history:
             history_text = ""
@@ -172,9 +512,17 @@ class GenerationService:
                 content = msg.get('content', '')
                 history_text += f"{role.title()}: {content}\n"
 
-            system_prompt = f"Previous conversation:\n{history_text}\n\n{system_prompt}"
+            suffix = f"Previous conversation:\n{history_text}\n{suffix}"
+
+        return suffix
 
-        return system_prompt.format(context=context, query=query)
+    def _encode_prompt(self,
+                       query: str,
+                       context: str,
+                       conversation_history: Optional[List[Dict[str, str]]] = None) -> List[int]:
+        """Tokenize a prompt as the cached system prompt ids followed by the request suffix"""
+        suffix = self._build_prompt_suffix(query, context, conversation_history)
+        return self.prefix_ids + self.tokenizer(suffix, add_special_tokens=False)["input_ids"]
 
     def _extract_response(self, generated_text: str, prompt: str) -> str:
         if prompt in generated_text:
@@ -247,7 +595,23 @@ class GenerationService:
         return '\n\n'.join(response_parts)
 
     def is_ready(self) -> bool:
-        return self.pipeline is not None
+        return self.model is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get generation executor, scheduler and budget statistics"""
+        return {
+            'model': self.model_name,
+            'backend': self.backend,
+            'executor': self.executor.stats(),
+            'scheduler': self.scheduler.stats() if self.scheduler else None,
+            'budget': self.budget_controller.stats()
+        }
+
+    def shutdown(self):
+        """Stop the scheduler and release the generation executor"""
+        if self.scheduler:
+            self.scheduler.stop()
+        self.executor.shutdown()
 
 
 generation_service = GenerationService()
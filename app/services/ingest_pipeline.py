@@ -0,0 +1,187 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.db.bm25_index import RECORD_FIELDS, BM25Index
+from app.db.vector_store import vector_store
+from app.services.embedding_service import embedding_service
+from app.services.processor_service import ProcessorService
+from app.utils.pipeline import PipelineStage, StreamingPipeline
+
+logger = setup_logging()
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class IngestRun:
+    """State and stages of one streaming knowledge base sync
+
+    Pages flow through process → embed → write as they arrive. Only the
+    chunks whose content hash changed reach the embed stage, and after a
+    chunk is written only its id and lexical fields are kept, so memory
+    does not grow with the vectors of the corpus.
+    """
+
+    def __init__(self,
+                 processor: ProcessorService,
+                 lexical_index: BM25Index,
+                 force_refresh: bool,
+                 report: ProgressCallback,
+                 on_write: Callable[[], None]):
+        self.processor = processor
+        self.lexical_index = lexical_index
+        self.force_refresh = force_refresh
+        self.report = report
+        self.on_write = on_write
+
+        self.existing: Optional[Dict[str, Dict[str, str]]] = None
+        self._existing_lock = asyncio.Lock()
+
+        self.unchanged_sources: Set[str] = set()
+        self.failed_sources: Set[str] = set()
+        self.current_ids: Set[str] = set()
+        self.records: List[Dict[str, Any]] = []
+
+        self.pages_done = 0
+        self.pages_total = 0
+        self.added = self.updated = self.unchanged = 0
+        self.embedded = self.written = 0
+
+        # Without a lexical index yet (cold start), rebuild it while writing
+        # so new chunks become keyword-searchable before the run ends.
+        self.index_while_writing = settings.RETRIEVAL_MODE == "hybrid" and not lexical_index.is_ready()
+        self._index_task: Optional[asyncio.Task] = None
+        self._indexed = 0
+
+    @property
+    def documents_processed(self) -> int:
+        return len(self.current_ids)
+
+    @property
+    def changed(self) -> int:
+        return self.added + self.updated
+
+    def pipeline(self) -> StreamingPipeline:
+        return StreamingPipeline([
+            PipelineStage("process", self.process,
+                          batch_size=1,
+                          concurrency=settings.INGEST_PROCESS_CONCURRENCY),
+            PipelineStage("embed", self.embed,
+                          batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+                          concurrency=settings.INGEST_EMBED_CONCURRENCY),
+            PipelineStage("write", self.write,
+                          batch_size=settings.INGEST_WRITE_BATCH_SIZE,
+                          concurrency=settings.INGEST_WRITE_CONCURRENCY),
+        ], queue_size=settings.INGEST_QUEUE_SIZE)
+
+    async def _load_existing(self) -> Dict[str, Dict[str, str]]:
+        """Content hash and source of stored chunks, loaded when the first page has changed
+
+        Runs where every source is unchanged never touch the vector store.
+        """
+        async with self._existing_lock:
+            if self.existing is None:
+                if self.force_refresh:
+                    await vector_store.delete_all_documents()
+                    self.existing = {}
+                else:
+                    self.existing = await vector_store.get_content_index()
+            return self.existing
+
+    def stale_ids(self, kept_sources: Set[str]) -> List[str]:
+        """Stored chunks that this run no longer produced
+
+        Chunks of sources that were skipped (unchanged or failed) are kept;
+        every other stored chunk missing from this run is stale, including
+        chunks of sources that are no longer crawled.
+        """
+        return [
+            doc_id for doc_id, entry in (self.existing or {}).items()
+            if doc_id not in self.current_ids and entry['source'] not in kept_sources
+        ]
+
+    def _keep_record(self, doc: Dict[str, Any]):
+        if settings.RETRIEVAL_MODE == "hybrid":
+            self.records.append({**{field: doc.get(field, "") for field in RECORD_FIELDS}, 'doc_id': doc['doc_id']})
+
+    async def process(self, pages: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Chunk scraped pages and pass on the chunks that are new or changed"""
+        changed = []
+        for url, scraped_data in pages:
+            self.pages_done += 1
+            if not scraped_data:
+                self.failed_sources.add(url)
+            elif scraped_data.get('unchanged'):
+                self.unchanged_sources.add(url)
+            else:
+                documents = await self.processor.process_scraped_content(scraped_data)
+                existing = await self._load_existing() if documents else {}
+
+                for doc in documents:
+                    if doc['doc_id'] in self.current_ids:
+                        continue
+                    self.current_ids.add(doc['doc_id'])
+
+                    existing_hash = existing.get(doc['doc_id'], {}).get('content_hash')
+                    if existing_hash == doc['content_hash']:
+                        self.unchanged += 1
+                        self._keep_record(doc)
+                        continue
+
+                    if existing_hash is None:
+                        self.added += 1
+                    else:
+                        self.updated += 1
+                    changed.append(doc)
+
+            self.report('scrape', self.pages_done, self.pages_total)
+        return changed
+
+    async def embed(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        embeddings = await embedding_service.encode_texts([doc['content'] for doc in documents])
+        for doc, embedding in zip(documents, embeddings):
+            doc['vector'] = embedding
+
+        self.embedded += len(documents)
+        self.report('embed', self.embedded, self.changed)
+        return documents
+
+    def _index_written(self):
+        """Start a lexical index rebuild once the records have doubled since the last one
+
+        Doubling keeps the total rebuild work linear in the corpus size. The
+        rebuild runs as a background task, so writers never wait for it; a
+        write that finds one running skips, and the final rebuild at the end
+        of the refresh covers whatever was written in between.
+        """
+        if self._index_task is not None and not self._index_task.done():
+            return
+        if len(self.records) < 2 * self._indexed:
+            return
+        records = list(self.records)
+        self._indexed = len(records)
+        self._index_task = asyncio.create_task(self._build_index(records))
+
+    async def _build_index(self, records: List[Dict[str, Any]]):
+        try:
+            await asyncio.to_thread(self.lexical_index.build, records)
+        except Exception as e:
+            logger.warning(f"Interim lexical index rebuild failed: {e}")
+
+    async def wait_for_index(self):
+        """Wait for a running interim rebuild so it cannot replace a later index"""
+        if self._index_task is not None:
+            await self._index_task
+
+    async def write(self, documents: List[Dict[str, Any]]):
+        await vector_store.add_documents(documents)
+        self.on_write()
+
+        for doc in documents:
+            self._keep_record(doc)
+        if self.index_while_writing:
+            self._index_written()
+
+        self.written += len(documents)
+        self.report('write', self.written, self.changed)
@@ -1,9 +1,10 @@
+import hashlib
 import re
+import uuid
 from typing import List, Dict, Any
 from datetime import datetime
 from app.core.config import settings
 from app.core.logging import setup_logging
-import json
 
 
 from unstructured.partition.html import partition_html
@@ -11,6 +12,9 @@ from unstructured.chunking.basic import chunk_elements
 
 logger = setup_logging()
 
+IDENTITY_FIELDS = ('source', 'category', 'section', 'tool_name', 'aspect', 'chunk_index')
+HASHED_FIELDS = ('content', 'source', 'category', 'section', 'tool_name', 'aspect', 'chunk_index', 'tool_rank')
+
 
 def extract_and_chunk_text_from_html(html_content):
     """Extract and chunk text from an HTML article."""
@@ -29,7 +33,6 @@ class ProcessorService:
     def __init__(self):
         self.chunk_size = settings.CHUNK_SIZE
         self.chunk_overlap = settings.CHUNK_OVERLAP
-        self.filepath = settings.FILEPATH
 
     async def process_scraped_content(self, scraped_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         documents = []
@@ -47,6 +50,8 @@ class ProcessorService:
             overview_doc = await self._create_overview_document(scraped_data, timestamp)
             documents.append(overview_doc)
 
+            self.assign_document_ids(documents)
+
             logger.info(f"Processed {len(documents)} documents from scraped content")
             return documents
 
@@ -125,6 +130,28 @@ class ProcessorService:
 
         return documents
 
+    def assign_document_ids(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Attach a stable object id and a content hash to every chunk
+
+        The id is derived from where the chunk sits (source, category, section,
+        tool, aspect, chunk index) so the same chunk keeps its id across
+        refreshes, while the hash changes whenever its stored content does.
+        """
+        seen: Dict[str, int] = {}
+
+        for doc in documents:
+            identity = '|'.join(str(doc.get(field, '')) for field in IDENTITY_FIELDS)
+            occurrence = seen.get(identity, 0)
+            seen[identity] = occurrence + 1
+            if occurrence:
+                identity = f"{identity}#{occurrence}"
+
+            hashed = '\x1f'.join(str(doc.get(field, '')) for field in HASHED_FIELDS)
+            doc['doc_id'] = str(uuid.uuid5(uuid.NAMESPACE_URL, identity))
+            doc['content_hash'] = hashlib.sha256(hashed.encode('utf-8')).hexdigest()
+
+        return documents
+
     def _build_tool_overview(self, tool: Dict[str, Any]) -> str:
         name = tool.get('name', '')
         rank = tool.get('rank', 0)
@@ -243,41 +270,3 @@ Tools Covered:
 
     def _is_html(self, text: str) -> bool:
         return any(tag in text.lower() for tag in ['<html', '<div', '<p', '<section', '<article'])
-    
-    def chunk_json_from_file(self,file_path:str):
-        """
-        Reads a JSON file and yields data in chunks.
-        Assumes the JSON file contains a top-level array of objects.
-
-        Args:
-            file_path (str): The path to the JSON file.
-            chunk_size (int): The number of objects to include in each chunk.
-
-        Yields:
-            list: A list of JSON objects representing a chunk of data.
-        """
-        chunks = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-                # Safely extract the modules dictionary
-                modules = data.get("event", {}).get("modules", {})
-                if not isinstance(modules, dict):
-                    raise TypeError("Expected 'event.modules' to be a dictionary.")
-
-                # Convert modules dict to list of objects
-                module_list = [{"name": k, "version": v} for k, v in modules.items()]
-
-              
-                for i in range(0, len(module_list), self.chunk_size):
-                    chunks.append(module_list[i:i + self.chunk_size])
-
-            return chunks
-
-        except FileNotFoundError:
-            print(f"Error: File not found at {file_path}")
-        except json.JSONDecodeError:
-            print(f"Error: Invalid JSON format in {file_path}")
-        except TypeError as e:
-            print(f"Error: {e}")
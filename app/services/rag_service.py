@@ -1,106 +1,199 @@
+import asyncio
 import time
-from typing import List, Dict, Any, Optional
-from app.db.weaviate_client import weaviate_client
+from typing import List, Dict, Any, Optional, AsyncIterator
+from app.db.bm25_index import BM25Index
+from app.db.vector_store import vector_store
 from app.services.scraper_service import ScraperService
 from app.services.processor_service import ProcessorService
 from app.services.embedding_service import embedding_service
+from app.services.generation_budget import CACHEABLE_REASONS
 from app.services.generation_service import generation_service
+from app.services.ingest_pipeline import IngestRun, ProgressCallback
+from app.services.refresh_jobs import RefreshJob, RefreshJobManager, RefreshScheduler
+from app.services.rerank_service import rerank_service
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.utils.cache import SemanticCache
+from app.utils.helper import reciprocal_rank_fusion
+from app.utils.readiness import WARMING, ReadinessRegistry
 
 logger = setup_logging()
 
+NO_RESULTS_RESPONSE = "I couldn't find relevant information to answer your question. Please try rephrasing or ask about specific ITSM tools."
+
 class RAGService:
     def __init__(self):
         self.scraper = ScraperService()
         self.processor = ProcessorService()
+        self.lexical_index = BM25Index(settings.BM25_INDEX_DIR)
+        self.answer_cache = SemanticCache(
+            max_size=settings.ANSWER_CACHE_SIZE,
+            ttl_seconds=settings.ANSWER_CACHE_TTL,
+            threshold=settings.ANSWER_CACHE_THRESHOLD
+        )
+        self.readiness = ReadinessRegistry()
+        self.readiness.register("vector_store")
+        self.readiness.register("embedding")
+        self.readiness.register("rerank", required=False)
+        self.readiness.register("generation")
+        self._startup_task: Optional[asyncio.Task] = None
+        self.refresh_jobs = RefreshJobManager(self.refresh_knowledge_base)
+        self.initial_ingestion: Optional[RefreshJob] = None
+        self.refresh_scheduler = RefreshScheduler(self.refresh_jobs, settings.DATA_REFRESH_HOURS)
         self.initialized = False
+        self.startup_error: Optional[str] = None
+
+    def start(self):
+        """Initialize in the background so the app serves health checks while models load"""
+        self._startup_task = asyncio.create_task(self._run_startup())
+
+    async def _run_startup(self):
+        try:
+            await self.initialize()
+        except Exception:
+            logger.error("RAG service startup failed, see the health endpoint for component status")
     
     async def initialize(self):
-        """Initialize all RAG components"""
+        """Initialize all RAG components
+
+        The vector store connects while the models load in their worker
+        threads; each component reports its stage through the readiness
+        registry as it goes.
+        """
         try:
             logger.info("Initializing RAG service...")
-            
-            
-            await weaviate_client.connect()
-            
-           
-            await embedding_service.initialize()
-            
-            
-            await generation_service.initialize()
+
+            results = await asyncio.gather(
+                self._start_component("vector_store", self._connect_stores()),
+                self._start_component("embedding", embedding_service.initialize()),
+                self._start_component("rerank", rerank_service.initialize(), ready=rerank_service.is_ready),
+                self._start_component("generation", generation_service.initialize(), warm_up=generation_service.warm_up),
+                return_exceptions=True
+            )
+            failures = [result for result in results if isinstance(result, BaseException)]
+            if failures:
+                raise failures[0]
             
            
-            doc_count = await weaviate_client.get_document_count()
+            doc_count = await vector_store.get_document_count()
             if doc_count == 0:
-                logger.info("No documents found, loading initial data...")
-                await self.refresh_knowledge_base()
+                logger.info("No documents found, loading initial data in the background...")
+                self.initial_ingestion, _ = self.refresh_jobs.submit()
+
+            if settings.AUTO_REFRESH:
+                self.refresh_scheduler.start()
             
             self.initialized = True
             logger.info("RAG service initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize RAG service: {e}")
+            self.startup_error = str(e)
             raise
     
+    async def _start_component(self, name: str, step, warm_up=None, ready=None):
+        """Run a component's startup steps and record its stage transitions"""
+        await self.readiness.run(name, step)
+        if warm_up is not None:
+            # Warming up only saves the first request some latency, so a
+            # failure there must not keep the component from serving
+            self.readiness.set_stage(name, WARMING)
+            try:
+                await warm_up()
+            except Exception as e:
+                logger.warning(f"Component {name} warm-up failed, continuing without it: {e}")
+
+        if ready is not None and not ready():
+            self.readiness.mark_disabled(name)
+        else:
+            self.readiness.mark_ready(name)
+
+    def is_ingesting(self) -> bool:
+        """True while the cold-start ingestion job is still running"""
+        return self.initial_ingestion is not None and not self.initial_ingestion.finished
+
+    async def _connect_stores(self):
+        await vector_store.connect()
+
+        if settings.RETRIEVAL_MODE == "hybrid" and not await asyncio.to_thread(self.lexical_index.load):
+            logger.info("No BM25 index found; hybrid retrieval starts after the next refresh")
+
     async def query(self, 
                    question: str, 
                    conversation_history: Optional[List[Dict[str, str]]] = None,
-                   max_results: int = 5) -> Dict[str, Any]:
+                   max_results: int = 5,
+                   use_cache: bool = True,
+                   deadline_ms: Optional[float] = None) -> Dict[str, Any]:
         """Process a query through the RAG pipeline"""
         if not self.initialized:
             raise RuntimeError("RAG service not initialized")
         
         start_time = time.time()
+        # Read before retrieval: a refresh that clears the cache while this
+        # answer is generated must keep it from being stored
+        cache_version = self.answer_cache.version
         
         try:
             
             query_embedding = await embedding_service.encode_query(question)
             
             
-            documents = await weaviate_client.search(
-                query_vector=query_embedding,
-                limit=max_results
-            )
+            documents = await self._retrieve(question, query_embedding, max_results)
             
             if not documents:
                 return {
-                    'response': "I couldn't find relevant information to answer your question. Please try rephrasing or ask about specific ITSM tools.",
+                    'response': NO_RESULTS_RESPONSE,
                     'sources': [],
                     'confidence': 0.0,
                     'processing_time': time.time() - start_time
                 }
+
+            # The answer depends on the conversation, which the cache key
+            # does not capture; only standalone questions are cached.
+            cache_enabled = use_cache and settings.ANSWER_CACHE_ENABLED and not conversation_history
+            document_ids = self._document_ids(documents)
+            if cache_enabled:
+                cached = self.answer_cache.lookup(query_embedding, document_ids)
+                if cached is not None:
+                    logger.info("Answered query from the semantic answer cache")
+                    return {
+                        **cached,
+                        'processing_time': time.time() - start_time,
+                        'cached': True
+                    }
             
             
-            response_text = await generation_service.generate_response(
+            generation = await generation_service.generate_response(
                 query=question,
                 context_documents=documents,
-                conversation_history=conversation_history
+                conversation_history=conversation_history,
+                deadline_ms=self._remaining_deadline(deadline_ms, start_time)
             )
+            response_text = generation['response']
             
             
-            sources = []
-            for doc in documents:
-                sources.append({
-                    'source': doc['source'],
-                    'category': doc['category'],
-                    'tool_name': doc['tool_name'],
-                    'certainty': doc['certainty'],
-                    'distance': doc['distance']
-                })
+            sources = self._build_sources(documents)
             
           
-            confidence = sum(doc['certainty'] for doc in documents) / len(documents)
+            confidence = self._compute_confidence(documents)
             
             processing_time = time.time() - start_time
             
             logger.info(f"Processed query in {processing_time:.2f}s with confidence {confidence:.3f}")
+
+            if cache_enabled and generation['stop_reason'] in CACHEABLE_REASONS:
+                self.answer_cache.store(query_embedding, document_ids, {
+                    'response': response_text,
+                    'sources': sources,
+                    'confidence': confidence
+                }, version=cache_version)
             
             return {
                 'response': response_text,
                 'sources': sources,
                 'confidence': confidence,
-                'processing_time': processing_time
+                'processing_time': processing_time,
+                'truncated': generation['truncated']
             }
             
         except Exception as e:
@@ -112,63 +205,256 @@ class RAGService:
                 'processing_time': time.time() - start_time
             }
     
-    async def refresh_knowledge_base(self, force_refresh: bool = False) -> Dict[str, Any]:
+    async def stream_query(self,
+                           question: str,
+                           conversation_history: Optional[List[Dict[str, str]]] = None,
+                           max_results: int = 5,
+                           use_cache: bool = True,
+                           deadline_ms: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query and stream the answer as events
+
+        Emits a ``sources`` event once retrieval is done, ``token`` events
+        while the model generates, and a final ``done`` event with timings.
+        """
+        if not self.initialized:
+            raise RuntimeError("RAG service not initialized")
+
         start_time = time.time()
-        
-        try:
-            logger.info("Starting knowledge base refresh...")
-            documents = []
-            scraped_data = await self.scraper.scrape_itsm_content()
-            
-            if scraped_data:
-                documents = await self.processor.process_scraped_content(scraped_data)
-                texts = [doc['content'] for doc in documents]
-            
-            else:
-                logger.warning("Scraping failed. Falling back to local JSON.")
-                chunks = self.processor.chunk_json_from_file(self.processor.filepath)
+        cache_version = self.answer_cache.version
 
-                # Flatten the nested list of chunks
-                flat_documents = [doc for chunk in chunks for doc in chunk]
-                for doc in flat_documents:
-                    doc['content'] = f"{doc['name']} {doc['version']}"
-                    doc["source"] = "fallback"
-                    doc["category"] = "module"
+        query_embedding = await embedding_service.encode_query(question)
+        documents = await self._retrieve(question, query_embedding, max_results)
 
+        if not documents:
+            yield {'type': 'sources', 'sources': [], 'confidence': 0.0}
+            yield {'type': 'token', 'text': NO_RESULTS_RESPONSE}
+            yield {
+                'type': 'done',
+                'response': NO_RESULTS_RESPONSE,
+                'confidence': 0.0,
+                'processing_time': time.time() - start_time
+            }
+            return
 
-                texts = [doc['content'] for doc in flat_documents]
+        confidence = self._compute_confidence(documents)
+        sources = self._build_sources(documents)
+        yield {
+            'type': 'sources',
+            'sources': sources,
+            'confidence': confidence,
+            'retrieval_time': time.time() - start_time
+        }
 
-                embeddings = await embedding_service.encode_texts(texts)
+        cache_enabled = use_cache and settings.ANSWER_CACHE_ENABLED and not conversation_history
+        document_ids = self._document_ids(documents)
+        if cache_enabled:
+            cached = self.answer_cache.lookup(query_embedding, document_ids)
+            if cached is not None:
+                yield {'type': 'token', 'text': cached['response']}
+                yield {
+                    'type': 'done',
+                    'response': cached['response'],
+                    'confidence': confidence,
+                    'processing_time': time.time() - start_time,
+                    'time_to_first_token': time.time() - start_time,
+                    'cached': True
+                }
+                return
+
+        first_token_time = None
+        async for event in generation_service.stream_response(
+            query=question,
+            context_documents=documents,
+            conversation_history=conversation_history,
+            deadline_ms=self._remaining_deadline(deadline_ms, start_time)
+        ):
+            if event['type'] == 'token' and first_token_time is None:
+                first_token_time = time.time()
+
+            if event['type'] == 'done':
+                event['confidence'] = confidence
+                event['processing_time'] = time.time() - start_time
+                event['time_to_first_token'] = (first_token_time - start_time) if first_token_time else None
+                logger.info(
+                    f"Streamed query in {event['processing_time']:.2f}s "
+                    f"(ttft={event['time_to_first_token'] or 0:.2f}s, "
+                    f"{event['tokens_per_second']:.1f} tokens/s)"
+                )
+                if cache_enabled and event['stop_reason'] in CACHEABLE_REASONS:
+                    self.answer_cache.store(query_embedding, document_ids, {
+                        'response': event['response'],
+                        'sources': sources,
+                        'confidence': confidence
+                    }, version=cache_version)
+
+            yield event
+
+    async def _retrieve(self, question: str, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Retrieve the documents handed to the generator
+
+        With reranking enabled a wider candidate set is retrieved and the
+        cross-encoder picks the best few of them.
+        """
+        if not rerank_service.is_ready():
+            return await self._search(question, query_embedding, limit)
+
+        candidates = await self._search(question, query_embedding, max(limit, settings.RERANK_CANDIDATES))
+        return await rerank_service.rerank(question, candidates, top_k=min(limit, settings.RERANK_TOP_K))
+
+    async def _search(self, question: str, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Search documents by vector, fused with BM25 results in hybrid mode"""
+        if settings.RETRIEVAL_MODE != "hybrid" or not self.lexical_index.is_ready():
+            return await vector_store.search(query_vector=query_embedding, limit=limit)
+
+        candidates = max(limit, settings.HYBRID_CANDIDATES)
+        vector_results, lexical_results = await asyncio.gather(
+            vector_store.search(query_vector=query_embedding, limit=candidates),
+            asyncio.to_thread(self.lexical_index.search, question, candidates)
+        )
+
+        fused = reciprocal_rank_fusion([vector_results, lexical_results], k=settings.RRF_K)
+        for doc in fused:
+            # Lexical-only hits have no vector score to report.
+            doc.setdefault('certainty', 0.0)
+            doc.setdefault('distance', 1.0)
+        return fused[:limit]
+
+    def _remaining_deadline(self, deadline_ms: Optional[float], start_time: float) -> Optional[float]:
+        """Share of a request deadline left for generation after retrieval"""
+        if not deadline_ms:
+            return None
+        elapsed_ms = (time.time() - start_time) * 1000
+        return max(1.0, deadline_ms - elapsed_ms)
+
+    def _build_sources(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build source attributions for retrieved documents"""
+        sources = []
+        for doc in documents:
+            sources.append({
+                'source': doc['source'],
+                'category': doc['category'],
+                'tool_name': doc['tool_name'],
+                'certainty': doc['certainty'],
+                'distance': doc['distance']
+            })
+        return sources
+
+    def _document_ids(self, documents: List[Dict[str, Any]]) -> frozenset:
+        """Identify the retrieved document set for answer cache lookups"""
+        return frozenset(doc.get('id') or doc['content'] for doc in documents)
 
-                # Attach vectors to each flat document
-                for doc, embedding in zip(flat_documents, embeddings):
-                    doc['vector'] = embedding
+    def _compute_confidence(self, documents: List[Dict[str, Any]]) -> float:
+        """Average retrieval certainty of the documents"""
+        return sum(doc['certainty'] for doc in documents) / len(documents)
 
-                documents = flat_documents  # assign for downstream use
+    async def refresh_knowledge_base(self,
+                                     force_refresh: bool = False,
+                                     progress: Optional[ProgressCallback] = None,
+                                     conditional: bool = False,
+                                     replay: bool = False) -> Dict[str, Any]:
+        """Sync the knowledge base with freshly scraped content
+
+        Sources are crawled concurrently and pages stream through the
+        process, embed and write stages of an IngestRun, connected by
+        bounded queues. Only chunks whose content hash changed are embedded
+        and written, and chunks that disappeared from a source that was
+        crawled are deleted. With ``force_refresh`` the class
+        is dropped and everything is rewritten. ``progress`` is called as
+        (stage, done, total). With ``conditional`` sources are fetched with
+        the validators of the last successful refresh and the run stops
+        early if none changed. With ``replay`` every page is parsed from its
+        latest stored snapshot without network access, e.g. after changing
+        the chunking settings.
+        """
+        start_time = time.time()
+        report = progress or (lambda stage, done, total: None)
+        committed = False
+        
+        try:
+            logger.info("Starting knowledge base refresh...")
+            run = IngestRun(
+                self.processor,
+                self.lexical_index,
+                force_refresh=force_refresh,
+                report=report,
+                on_write=self.answer_cache.clear
+            )
+
+            urls = self.scraper.snapshot_urls() if replay else await self.scraper.discover_urls()
+            run.pages_total = len(urls)
+            report('scrape', 0, len(urls))
+            pages = self.scraper.crawl(urls, conditional=conditional and not (force_refresh or replay), replay=replay)
+            try:
+                stage_stats = await run.pipeline().run(pages)
+            finally:
+                await run.wait_for_index()
+
+            if run.failed_sources:
+                logger.warning(f"{len(run.failed_sources)} of {len(urls)} sources could not be scraped")
+
+            if not run.documents_processed and run.unchanged_sources:
+                self.scraper.fetch_state.commit()
+                committed = True
+                return {
+                    'status': 'success',
+                    'message': 'Sources unchanged since the last refresh',
+                    'documents_processed': 0,
+                    'processing_time': time.time() - start_time
+                }
             
-            if not documents:
-                raise Exception("No documents were processed from scraped content or fallback.")
+            if not run.documents_processed:
+                raise Exception("No documents were processed from scraped content or stored snapshots.")
 
-            # Only embed again if we didn't do it during fallback
-            if 'vector' not in documents[0]:
-                embeddings = await embedding_service.encode_texts(texts)
-                for doc, embedding in zip(documents, embeddings):
-                    doc['vector'] = embedding
+            # Pages that were skipped (unchanged or failed) keep their chunks;
+            # the stale chunks of every other source are deleted.
+            kept_sources = run.unchanged_sources | run.failed_sources
+            deleted_ids = run.stale_ids(kept_sources)
+            if deleted_ids:
+                report('delete', 0, len(deleted_ids))
+                await vector_store.delete_documents(deleted_ids)
+                report('delete', len(deleted_ids), len(deleted_ids))
+            await vector_store.flush()
 
-            if force_refresh:
-                await weaviate_client.delete_all_documents()
+            if force_refresh or run.changed or deleted_ids:
+                self.answer_cache.clear()
+                rerank_service.score_cache.clear()
 
-            await weaviate_client.add_documents(documents)
+            if settings.RETRIEVAL_MODE == "hybrid" and (
+                force_refresh or run.changed or deleted_ids or not self.lexical_index.is_ready()
+            ):
+                report('index', 0, 1)
+                # A forced run wiped the vector store, failed sources included,
+                # so none of the old lexical records may be carried over.
+                carried_sources = set() if force_refresh else kept_sources
+                indexed = run.records + self.lexical_index.documents_for_sources(carried_sources)
+                await asyncio.to_thread(self._rebuild_lexical_index, indexed)
+                report('index', 1, 1)
 
+            self.scraper.fetch_state.commit()
+            committed = True
             processing_time = time.time() - start_time
 
-            logger.info(f"Knowledge base refreshed successfully in {processing_time:.2f}s")
+            logger.info(
+                f"Knowledge base refreshed successfully in {processing_time:.2f}s "
+                f"(added={run.added}, updated={run.updated}, deleted={len(deleted_ids)}, "
+                f"unchanged={run.unchanged})"
+            )
+            for name, stats in stage_stats.items():
+                logger.info(
+                    f"Ingest stage {name}: {stats['items']} items in {stats['batches']} batches, "
+                    f"{stats['items_per_second']:.1f} items/s, busy {stats['busy_seconds']:.2f}s"
+                )
 
             return {
                 'status': 'success',
                 'message': 'Knowledge base updated successfully',
-                'documents_processed': len(documents),
-                'processing_time': processing_time
+                'documents_processed': run.documents_processed,
+                'documents_added': run.added,
+                'documents_updated': run.updated,
+                'documents_deleted': len(deleted_ids),
+                'documents_unchanged': run.unchanged,
+                'processing_time': processing_time,
+                'stage_stats': stage_stats
             }
 
         except Exception as e:
@@ -180,18 +466,38 @@ class RAGService:
                 'processing_time': time.time() - start_time
             }
 
+        finally:
+            # Also runs when the refresh job is cancelled
+            if not committed:
+                self.scraper.fetch_state.discard()
+
+    def _rebuild_lexical_index(self, documents: List[Dict[str, Any]]):
+        """Rebuild and persist the BM25 index over the current set of chunks"""
+        self.lexical_index.build(documents)
+        self.lexical_index.save()
+
     async def get_health_status(self) -> Dict[str, Any]:
         """Get health status of all RAG components"""
         try:
-            doc_count = await weaviate_client.get_document_count()
+            doc_count = await vector_store.get_document_count() if vector_store.is_ready() else 0
+
+            if self.initialized and self.is_ingesting():
+                status = 'degraded'
+            elif self.initialized:
+                status = 'healthy'
+            elif self.readiness.failed() or self.startup_error:
+                status = 'error'
+            else:
+                status = 'initializing'
             
             return {
-                'status': 'healthy' if self.initialized else 'initializing',
-                'weaviate_ready': weaviate_client.client is not None,
-                'embedding_ready': embedding_service.is_ready(),
-                'generation_ready': generation_service.is_ready(),
+                'status': status,
+                'weaviate_ready': vector_store.is_ready(),
+                'model_ready': self.readiness.is_ready("embedding") and self.readiness.is_ready("generation"),
                 'document_count': doc_count,
-                'last_updated': None 
+                'last_updated': None,
+                'components': self.readiness.snapshot(),
+                'ingestion': self.initial_ingestion.to_dict() if self.initial_ingestion else {}
             }
             
         except Exception as e:
@@ -199,17 +505,42 @@ class RAGService:
             return {
                 'status': 'error',
                 'weaviate_ready': False,
-                'embedding_ready': False,
-                'generation_ready': False,
+                'model_ready': False,
                 'document_count': 0,
-                'last_updated': None
+                'last_updated': None,
+                'components': self.readiness.snapshot()
             }
     
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Get runtime metrics of the RAG components"""
+        return {
+            'embedding': embedding_service.get_stats(),
+            'generation': generation_service.get_stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'rerank': rerank_service.get_stats(),
+            'refresh_scheduler': self.refresh_scheduler.stats(),
+            'snapshots': self.scraper.snapshots.stats() if self.scraper.snapshots else None
+        }
+
+    async def shutdown(self):
+        """Release resources held by the RAG components"""
+        if self._startup_task and not self._startup_task.done():
+            self._startup_task.cancel()
+            await asyncio.gather(self._startup_task, return_exceptions=True)
+        await self.refresh_scheduler.stop()
+        await self.refresh_jobs.shutdown()
+        await self.scraper.close()
+        embedding_service.shutdown()
+        generation_service.shutdown()
+        rerank_service.shutdown()
+        await vector_store.close()
+        self.initialized = False
+
     def is_ready(self) -> bool:
         """Check if RAG service is ready"""
         return (
             self.initialized and
-            weaviate_client.client is not None and
+            vector_store.is_ready() and
             embedding_service.is_ready() and
             generation_service.is_ready()
         )
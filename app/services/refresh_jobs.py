@@ -0,0 +1,268 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = frozenset({COMPLETED, FAILED, CANCELLED})
+
+RefreshRunner = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+class RefreshConflict(Exception):
+    """A refresh with other options is already queued behind the running one"""
+
+
+class RefreshJob:
+    """One run of the refresh pipeline with per-stage progress and timings"""
+
+    def __init__(self, force_refresh: bool, conditional: bool = False, replay: bool = False):
+        self.id = uuid.uuid4().hex
+        self.force_refresh = force_refresh
+        self.conditional = conditional
+        self.replay = replay
+        self.state = QUEUED
+        self.stage: Optional[str] = None
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def options(self) -> Tuple[bool, bool, bool]:
+        return self.force_refresh, self.conditional, self.replay
+
+    def record(self, stage: str, done: int, total: int):
+        """Progress callback handed to the refresh pipeline
+
+        Stages overlap, so every stage keeps its own progress and stays open
+        until it reports completion; ``stage`` is the one reported last.
+        """
+        now = time.time()
+        entry = self.stages.setdefault(stage, {'started_at': now, 'finished_at': None})
+        entry.update({'done': done, 'total': total})
+        entry['finished_at'] = now if total and done >= total else None
+        self.stage = stage
+
+    def finish(self, state: str):
+        self.state = state
+        self.finished_at = time.time()
+        for entry in self.stages.values():
+            if entry['finished_at'] is None:
+                entry['finished_at'] = self.finished_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'force_refresh': self.force_refresh,
+            'replay': self.replay,
+            'stage': self.stage,
+            'stages': {
+                name: {
+                    'done': stage.get('done', 0),
+                    'total': stage.get('total', 0),
+                    'elapsed': (stage['finished_at'] or now) - stage['started_at']
+                }
+                for name, stage in self.stages.items()
+            },
+            'created_at': self.created_at,
+            'elapsed': ((self.finished_at or now) - self.started_at) if self.started_at else 0.0,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class RefreshJobManager:
+    """Runs refreshes as background jobs, one at a time
+
+    A refresh requested while another is running joins the running job
+    when both have the same options, instead of starting a second embedding
+    run. A refresh with other options is queued as a single follow-up job
+    that starts once the running one finishes; requests matching the
+    follow-up join it, any other request raises RefreshConflict. Finished
+    jobs are kept for status queries up to ``history`` entries.
+    """
+
+    def __init__(self, runner: RefreshRunner, history: int = 20):
+        self.runner = runner
+        self.history = history
+        self.jobs: "OrderedDict[str, RefreshJob]" = OrderedDict()
+        self._active: Optional[RefreshJob] = None
+        self._pending: Optional[RefreshJob] = None
+
+    def submit(self,
+               force_refresh: bool = False,
+               conditional: bool = False,
+               replay: bool = False) -> Tuple[RefreshJob, bool]:
+        """Start or queue a refresh job; returns the job and whether an existing one was reused"""
+        options = (force_refresh, conditional, replay)
+        running = self.active()
+        if running is not None and running.options == options:
+            logger.info(f"Refresh already running as job {running.id}, joining it")
+            return running, True
+
+        if self._pending is not None:
+            if self._pending.options == options:
+                logger.info(f"Refresh already queued as job {self._pending.id}, joining it")
+                return self._pending, True
+            raise RefreshConflict(
+                f"Refresh job {self._pending.id} with other options is already queued"
+            )
+
+        job = RefreshJob(force_refresh, conditional, replay)
+        if running is not None:
+            self._pending = job
+            job.task = asyncio.create_task(self._run(job, after=running.task))
+        else:
+            self._active = job
+            job.task = asyncio.create_task(self._run(job))
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+
+        action = f"Queued refresh job {job.id} after {running.id}" if running else f"Started refresh job {job.id}"
+        logger.info(f"{action} (force_refresh={force_refresh}, conditional={conditional}, replay={replay})")
+        return job, False
+
+    async def _run(self, job: RefreshJob, after: Optional[asyncio.Task] = None):
+        try:
+            if after is not None:
+                # Wait without propagating our own cancellation into the running job
+                await asyncio.wait({after})
+                self._pending = None
+                self._active = job
+
+            job.state = RUNNING
+            job.started_at = time.time()
+            job.result = await self.runner(
+                force_refresh=job.force_refresh,
+                progress=job.record,
+                conditional=job.conditional,
+                replay=job.replay
+            )
+            if job.result.get('status') == 'success':
+                job.finish(COMPLETED)
+            else:
+                job.error = job.result.get('message')
+                job.finish(FAILED)
+        except asyncio.CancelledError:
+            job.finish(CANCELLED)
+            logger.info(f"Refresh job {job.id} cancelled")
+        except Exception as e:
+            job.error = str(e)
+            job.finish(FAILED)
+            logger.error(f"Refresh job {job.id} failed: {e}")
+        finally:
+            if self._pending is job:
+                self._pending = None
+
+    def get(self, job_id: str) -> Optional[RefreshJob]:
+        return self.jobs.get(job_id)
+
+    def active(self) -> Optional[RefreshJob]:
+        if self._active is not None and not self._active.finished:
+            return self._active
+        return None
+
+    async def cancel(self, job_id: str) -> Optional[RefreshJob]:
+        """Cancel a running job and wait for it to stop; None if unknown"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        if not job.finished and job.task is not None:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+            # A job cancelled before it started never reached its own handler
+            if not job.finished:
+                job.finish(CANCELLED)
+            if self._pending is job:
+                self._pending = None
+        return job
+
+    async def shutdown(self):
+        """Cancel the queued and the running job, if any"""
+        for job in (self._pending, self.active()):
+            if job is not None:
+                await self.cancel(job.id)
+
+
+class RefreshScheduler:
+    """Submits a conditional refresh every ``interval_hours``
+
+    Scheduled runs go through the job manager, so they join a matching
+    refresh that is already running or queued instead of starting another
+    one, and are skipped when a refresh with other options is queued. Conditional fetches
+    make runs against an unchanged source cost a single HTTP request.
+    """
+
+    def __init__(self, jobs: RefreshJobManager, interval_hours: float):
+        self.jobs = jobs
+        self.interval = interval_hours * 3600
+        self.next_run: Optional[float] = None
+        self.last_job_id: Optional[str] = None
+        self.runs = 0
+        self.skipped_unchanged = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        if self.interval <= 0:
+            logger.info("Auto refresh disabled (interval is not positive)")
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Auto refresh scheduled every {self.interval / 3600:g}h")
+
+    async def _loop(self):
+        while True:
+            self.next_run = time.time() + self.interval
+            await asyncio.sleep(self.interval)
+
+            try:
+                job, _ = self.jobs.submit(conditional=True)
+            except RefreshConflict as e:
+                logger.info(f"Skipping scheduled refresh: {e}")
+                continue
+            self.last_job_id = job.id
+            self.runs += 1
+            # Wait without propagating our own cancellation into the job
+            await asyncio.wait({job.task})
+            if job.result and job.result.get('status') == 'success' and not job.result.get('documents_processed'):
+                self.skipped_unchanged += 1
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.next_run = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self._task is not None and not self._task.done(),
+            'interval_hours': self.interval / 3600,
+            'next_run': self.next_run,
+            'last_job_id': self.last_job_id,
+            'runs': self.runs,
+            'skipped_unchanged': self.skipped_unchanged
+        }
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+from typing import Any, Dict, List
+
+from sentence_transformers import CrossEncoder
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.utils.cache import TTLCache
+from app.utils.executor import InstrumentedExecutor
+
+logger = setup_logging()
+
+
+class RerankService:
+    def __init__(self):
+        self.model = None
+        self.model_name = settings.RERANK_MODEL
+        self.executor = InstrumentedExecutor("rerank", settings.RERANK_WORKERS)
+        self.score_cache = TTLCache(
+            max_size=settings.RERANK_CACHE_SIZE,
+            ttl_seconds=settings.RERANK_CACHE_TTL
+        )
+        self.requests = 0
+        self.budget_exceeded = 0
+        self.skipped_busy = 0
+
+    async def initialize(self):
+        """Load the cross-encoder when reranking is enabled"""
+        if not settings.RERANK_ENABLED:
+            return
+
+        try:
+            logger.info(f"Loading rerank model: {self.model_name}")
+            self.executor.start()
+            self.model = await self.executor.run(
+                CrossEncoder,
+                self.model_name,
+                device=settings.DEVICE,
+                cache_folder=settings.HF_CACHE_DIR
+            )
+            logger.info("Rerank model loaded successfully")
+
+        except Exception as e:
+            logger.error(f"Failed to load rerank model, reranking disabled: {e}")
+            self.model = None
+
+    async def rerank(self,
+                     query: str,
+                     documents: List[Dict[str, Any]],
+                     top_k: int,
+                     budget_ms: float = settings.RERANK_BUDGET_MS) -> List[Dict[str, Any]]:
+        """Rescore candidates with the cross-encoder and keep the best top_k
+
+        Candidates are scored in retrieval order, in small batches, and the
+        budget is checked between batches: a batch is only started when the
+        previous one suggests it will finish in time, so no scoring keeps
+        a worker busy after the request gave up on it. Candidates that were
+        not scored keep their retrieval order behind the scored ones. When
+        every one of the ``RERANK_WORKERS`` workers is busy only cached
+        scores are used instead of queueing behind them.
+        """
+        if not self.model or not documents:
+            return documents[:top_k]
+
+        self.requests += 1
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget_ms / 1000
+        query_hash = hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+
+        scores: Dict[int, float] = {}
+        uncached = []
+        for i, doc in enumerate(documents):
+            cached = self.score_cache.get((query_hash, self._document_key(doc)))
+            if cached is not None:
+                scores[i] = cached
+            else:
+                uncached.append(i)
+
+        if uncached and self.executor.backlog() >= self.executor.max_workers:
+            self.skipped_busy += 1
+            logger.warning(
+                f"All {self.executor.max_workers} rerank workers busy, "
+                f"keeping retrieval order for {len(uncached)} uncached candidates"
+            )
+            uncached = []
+
+        batch_size = settings.RERANK_BATCH_SIZE
+        batch_seconds = 0.0
+        for start in range(0, len(uncached), batch_size):
+            if deadline - loop.time() <= batch_seconds:
+                self.budget_exceeded += 1
+                logger.warning(f"Reranking stopped at its {budget_ms:.0f}ms budget")
+                break
+
+            batch = uncached[start:start + batch_size]
+            pairs = [(query, documents[i]['content']) for i in batch]
+            began = loop.time()
+            batch_scores = await self.executor.run(
+                self.model.predict, pairs, batch_size=len(pairs), show_progress_bar=False
+            )
+            batch_seconds = loop.time() - began
+
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self.score_cache.set((query_hash, self._document_key(documents[i])), float(score))
+
+        scored = sorted(scores, key=scores.get, reverse=True)
+        unscored = [i for i in range(len(documents)) if i not in scores]
+
+        reranked = []
+        for i in scored + unscored:
+            doc = dict(documents[i])
+            if i in scores:
+                doc['rerank_score'] = scores[i]
+            reranked.append(doc)
+
+        return reranked[:top_k]
+
+    def _document_key(self, doc: Dict[str, Any]) -> str:
+        return doc.get('id') or hashlib.sha1(doc['content'].encode("utf-8")).hexdigest()
+
+    def is_ready(self) -> bool:
+        return self.model is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get reranking statistics"""
+        return {
+            'enabled': self.is_ready(),
+            'model': self.model_name,
+            'requests': self.requests,
+            'budget_exceeded': self.budget_exceeded,
+            'skipped_busy': self.skipped_busy,
+            'score_cache': self.score_cache.stats(),
+            'executor': self.executor.stats()
+        }
+
+    def shutdown(self):
+        """Release the rerank executor"""
+        self.executor.shutdown()
+
+
+rerank_service = RerankService()
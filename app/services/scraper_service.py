@@ -1,59 +1,251 @@
 import asyncio
+import functools
+import hashlib
+import xml.etree.ElementTree as ElementTree
 import aiohttp
-from bs4 import BeautifulSoup
-from typing import Dict, List, Optional, Any
-import re
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.db.fetch_state import FetchStateStore
+from app.db.snapshot_store import SnapshotStore
+from app.services.extraction import HtmlExtractor
+from app.utils.rate_limit import HostRateLimiter
 
 logger = setup_logging()
 
+
+class FetchResult:
+    """Outcome of a single page fetch"""
+
+    def __init__(self, url: str, status: int, text: str = "", headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.headers = headers or {}
+        self.body_hash = hashlib.sha256(text.encode("utf-8")).hexdigest() if text else ""
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+    def validators(self) -> Dict[str, Any]:
+        return {
+            'etag': self.headers.get('ETag'),
+            'last_modified': self.headers.get('Last-Modified'),
+            'body_hash': self.body_hash
+        }
+
+
 class ScraperService:
     def __init__(self):
         self.timeout = settings.SCRAPING_TIMEOUT
         self.delay = settings.SCRAPING_DELAY
         self.max_retries = settings.MAX_RETRIES
-        
-    async def scrape_itsm_content(self, url: str = None) -> Optional[Dict[str, Any]]:
-        """Scrape ITSM content from the specified URL"""
-        target_url = url or settings.TARGET_URL
-        
+        self.fetch_state = FetchStateStore(settings.FETCH_STATE_FILE)
+        self.limiter = HostRateLimiter(settings.SCRAPING_HOST_CONCURRENCY, settings.SCRAPING_DELAY)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.extractor = HtmlExtractor(settings.SCRAPING_PARSER)
+        self.snapshots = SnapshotStore(settings.SNAPSHOT_DIR, settings.SNAPSHOT_KEEP) if settings.SNAPSHOT_ENABLED else None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Shared pooled session, created on first use inside the event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.SCRAPING_MAX_CONNECTIONS,
+                limit_per_host=settings.SCRAPING_HOST_CONCURRENCY,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Close the shared session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def discover_urls(self,
+                            seed_urls: Optional[List[str]] = None,
+                            sitemap_url: Optional[str] = None) -> List[str]:
+        """Resolve the crawl list from TARGET_URL, seed URLs and an optional sitemap"""
+        urls = [settings.TARGET_URL, *(seed_urls if seed_urls is not None else settings.CRAWL_SEED_URLS)]
+
+        sitemap_url = sitemap_url or settings.CRAWL_SITEMAP_URL
+        if sitemap_url:
+            urls.extend(await self._read_sitemap(sitemap_url))
+
+        unique = list(dict.fromkeys(url for url in urls if url))
+        if len(unique) > settings.CRAWL_MAX_PAGES:
+            logger.warning(f"Crawl list truncated from {len(unique)} to {settings.CRAWL_MAX_PAGES} pages")
+            unique = unique[:settings.CRAWL_MAX_PAGES]
+        return unique
+
+    async def _read_sitemap(self, sitemap_url: str, depth: int = 0) -> List[str]:
+        """Page URLs listed in a sitemap, following one level of sitemap index"""
+        result = await self._fetch_with_retry(self._get_session(), sitemap_url)
+        if not result or not result.text:
+            logger.warning(f"Could not read sitemap {sitemap_url}")
+            return []
+
+        try:
+            root = ElementTree.fromstring(result.text)
+        except ElementTree.ParseError as e:
+            logger.warning(f"Invalid sitemap {sitemap_url}: {e}")
+            return []
+
+        locations = [
+            element.text.strip() for element in root.iter()
+            if element.tag.endswith('loc') and element.text
+        ]
+        if not root.tag.endswith('sitemapindex'):
+            return locations
+        if depth > 0:
+            return []
+
+        nested = await asyncio.gather(*(self._read_sitemap(url, depth + 1) for url in locations))
+        return [url for urls in nested for url in urls]
+
+    def snapshot_urls(self) -> List[str]:
+        """URLs that can be replayed from the snapshot store"""
+        return self.snapshots.urls() if self.snapshots else []
+
+    async def crawl(self,
+                    urls: List[str],
+                    conditional: bool = False,
+                    replay: bool = False) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Scrape pages concurrently and yield (url, scraped_data) as each one finishes
+
+        Up to ``SCRAPING_MAX_CONNECTIONS`` workers share one pooled session
+        and pull URLs from the list; the per-host limiter keeps each host
+        within its concurrency and delay limits, so the crawl takes about as
+        long as the slowest host. Finished pages wait in a queue bounded by
+        ``INGEST_QUEUE_SIZE``: when the consumer falls behind the workers
+        block, so memory stays flat however many URLs are crawled. Failed
+        pages yield ``None``. With ``replay`` pages are read from their
+        latest snapshot instead of the network.
+        """
+        if replay:
+            fetch = self._replay_page
+        else:
+            fetch = functools.partial(self._scrape_page, self._get_session(), conditional=conditional)
+
+        pending = iter(urls)
+        finished: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.INGEST_QUEUE_SIZE))
+
+        async def work():
+            for url in pending:
+                try:
+                    page = await fetch(url)
+                except Exception as e:
+                    logger.error(f"Error crawling {url}: {e}")
+                    page = (url, None)
+                await finished.put(page)
+
+        workers = [asyncio.create_task(work()) for _ in range(min(len(urls), settings.SCRAPING_MAX_CONNECTIONS))]
+        try:
+            for _ in range(len(urls)):
+                yield await finished.get()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def scrape_itsm_content(self, url: str = None, conditional: bool = False) -> Optional[Dict[str, Any]]:
+        """Scrape ITSM content from the specified URL
+
+        With ``conditional`` the request carries the validators of the last
+        ingested fetch; if the page is unchanged (304, or the same body
+        hash) parsing is skipped and ``{'url': ..., 'unchanged': True}`` is
+        returned.
+        """
+        _, scraped_data = await self._scrape_page(self._get_session(), url or settings.TARGET_URL, conditional)
+        return scraped_data
+
+    async def _scrape_page(self,
+                           session: aiohttp.ClientSession,
+                           target_url: str,
+                           conditional: bool) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Fetch and parse one page"""
         try:
             logger.info(f"Scraping content from: {target_url}")
-            
-            async with aiohttp.ClientSession() as session:
-                content = await self._fetch_with_retry(session, target_url)
-                
-            if not content:
-                return None
+
+            previous = self.fetch_state.get(target_url) if conditional else None
+            result = await self._fetch_with_retry(session, target_url, previous)
                 
+            if not result:
+                # Reported as failed, so the refresh counts it and keeps the
+                # source's existing chunks; snapshots are replayed on request only
+                return target_url, None
+
+            if result.not_modified or (previous and result.body_hash == previous.get('body_hash')):
+                logger.info(f"{target_url} is unchanged since the last refresh")
+                return target_url, {'url': target_url, 'unchanged': True}
+
+            if self.snapshots:
+                await self._save_snapshot(result)
+
+            # Parsing is CPU bound; keep it off the event loop so other
+            # fetches of the crawl continue meanwhile
+            scraped_data = await asyncio.to_thread(self.extractor.extract, result.text, target_url)
+            self.fetch_state.stage(target_url, result.validators())
             
-            soup = BeautifulSoup(content, 'html.parser')
-            
-          
-            scraped_data = await self._extract_structured_content(soup, target_url)
-            
-            logger.info(f"Successfully scraped {len(scraped_data.get('sections', []))} sections")
-            return scraped_data
+            logger.info(f"Successfully scraped {len(scraped_data.get('sections', []))} sections from {target_url}")
+            return target_url, scraped_data
             
         except Exception as e:
-            logger.error(f"Error scraping content: {e}")
-            return None
+            logger.error(f"Error scraping {target_url}: {e}")
+            return target_url, None
     
-    async def _fetch_with_retry(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
-        """Fetch URL content with retry logic"""
+    async def _replay_page(self, url: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Parse the latest stored snapshot of a page"""
+        try:
+            scraped_data = await asyncio.to_thread(self._extract_snapshot, url)
+            if scraped_data is None:
+                logger.warning(f"No snapshot stored for {url}")
+            return url, scraped_data
+
+        except Exception as e:
+            logger.error(f"Error replaying snapshot of {url}: {e}")
+            return url, None
+
+    def _extract_snapshot(self, url: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.snapshots.latest(url) if self.snapshots else None
+        if snapshot is None:
+            return None
+        return self.extractor.extract(snapshot['html'], url)
+
+    async def _save_snapshot(self, result: FetchResult):
+        """Keep the raw page for offline replay; a failed write does not fail the scrape"""
+        try:
+            await asyncio.to_thread(self.snapshots.save, result.url, result.text, result.headers)
+        except Exception as e:
+            logger.warning(f"Could not store snapshot of {result.url}: {e}")
+
+    async def _fetch_with_retry(self,
+                                session: aiohttp.ClientSession,
+                                url: str,
+                                validators: Optional[Dict[str, Any]] = None) -> Optional[FetchResult]:
+        """Fetch URL content with retry logic, conditionally when validators are given"""
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
         
         for attempt in range(self.max_retries):
             try:
                 timeout = aiohttp.ClientTimeout(total=self.timeout)
-                async with session.get(url, headers=headers, timeout=timeout) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    else:
-                        logger.warning(f"HTTP {response.status} on attempt {attempt + 1}")
+                async with self.limiter.acquire(url):
+                    async with session.get(url, headers=headers, timeout=timeout) as response:
+                        if response.status == 304:
+                            return FetchResult(url, 304, headers=dict(response.headers))
+                        if response.status == 200:
+                            return FetchResult(url, 200, await response.text(), dict(response.headers))
+                        else:
+                            logger.warning(f"HTTP {response.status} from {url} on attempt {attempt + 1}")
                         
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
@@ -63,201 +255,3 @@ class ScraperService:
         
         logger.error(f"All {self.max_retries} attempts failed for {url}")
         return None
-    
-    async def _extract_structured_content(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
-        """Extract and structure content from the webpage"""
-        content_data = {
-            'url': url,
-            'title': self._extract_title(soup),
-            'sections': [],
-            'tools': [],
-            'metadata': self._extract_metadata(soup)
-        }
-        
-   
-        main_content = self._find_main_content(soup)
-        if not main_content:
-            return content_data
-        
-
-        sections = await self._extract_sections(main_content)
-        content_data['sections'] = sections
-      
-        tools = await self._extract_tools(main_content)
-        content_data['tools'] = tools
-        
-        return content_data
-    
-    def _extract_title(self, soup: BeautifulSoup) -> str:
-        """Extract page title"""
-        selectors = ['title', 'h1', '.title', '.post-title']
-        
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                return element.get_text().strip()
-        
-        return "ITSM Tools Guide"
-    
-    def _find_main_content(self, soup: BeautifulSoup) -> Optional[BeautifulSoup]:
-        """Find the main content area"""
-        selectors = [
-            'article', '.content', '.post-content', '.entry-content',
-            '.blog-content', 'main', '.main-content', '[role="main"]'
-        ]
-        
-        for selector in selectors:
-            content = soup.select_one(selector)
-            if content:
-                return content
-        
-        return soup.find('body')
-    
-    async def _extract_sections(self, content: BeautifulSoup) -> List[Dict[str, Any]]:
-        """Extract content sections"""
-        sections = []
-        current_section = None
-        
-     
-        elements = content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol', 'div'])
-        
-        for element in elements:
-            if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            
-                if current_section and current_section.get('content', '').strip():
-                    sections.append(current_section)
-                
-            
-                current_section = {
-                    'title': element.get_text().strip(),
-                    'level': int(element.name[1]),
-                    'content': '',
-                    'type': 'section'
-                }
-            else:
-               
-                if current_section is not None:
-                    text = element.get_text().strip()
-                    if text and len(text) > 10: 
-                        current_section['content'] += text + '\n\n'
-        
-        
-        if current_section and current_section.get('content', '').strip():
-            sections.append(current_section)
-        
-        return sections
-    
-    async def _extract_tools(self, content: BeautifulSoup) -> List[Dict[str, Any]]:
-        """Extract ITSM tool information"""
-        tools = []
-        text_content = content.get_text()
-        
-       
-        tool_pattern = r'(\d+)\.\s*([A-Za-z][A-Za-z\s&\-]+)(?:\s*[-–]\s*(.+?))?(?=\n|\r|$)'
-        matches = re.finditer(tool_pattern, text_content, re.MULTILINE)
-        
-        for match in matches:
-            rank = int(match.group(1))
-            name = match.group(2).strip()
-            description = match.group(3).strip() if match.group(3) else ""
-            
-            
-            if len(name) < 3 or rank > 20:
-                continue
-            
-            
-            tool_details = await self._extract_tool_details(content, name)
-            
-            tools.append({
-                'rank': rank,
-                'name': name,
-                'description': description,
-                'details': tool_details
-            })
-        
-        return tools
-    
-    async def _extract_tool_details(self, content: BeautifulSoup, tool_name: str) -> Dict[str, Any]:
-        """Extract detailed information for a specific tool"""
-        details = {
-            'features': [],
-            'pricing': '',
-            'pros': [],
-            'cons': [],
-            'rating': '',
-            'best_for': ''
-        }
-        
-        text = content.get_text().lower()
-        tool_name_lower = tool_name.lower()
-        
-        
-        tool_start = text.find(tool_name_lower)
-        if tool_start == -1:
-            return details
-        
-       
-        context_start = max(0, tool_start - 500)
-        context_end = min(len(text), tool_start + 2000)
-        tool_context = text[context_start:context_end]
-        
-        
-        pricing_patterns = [
-            r'pricing[:\s]*([^\n]{1,100})',
-            r'price[:\s]*([^\n]{1,100})',
-            r'cost[:\s]*([^\n]{1,100})',
-            r'\$\d+[^\n]{0,50}'
-        ]
-        
-        for pattern in pricing_patterns:
-            match = re.search(pattern, tool_context)
-            if match:
-                details['pricing'] = match.group(0).strip()
-                break
-        
-        
-        rating_patterns = [
-            r'(\d+\.?\d*)/5',
-            r'(\d+\.?\d*)\s*stars?',
-            r'rating[:\s]*(\d+\.?\d*)'
-        ]
-        
-        for pattern in rating_patterns:
-            match = re.search(pattern, tool_context)
-            if match:
-                details['rating'] = match.group(1)
-                break
-        
-        return details
-    
-    def _extract_metadata(self, soup: BeautifulSoup) -> Dict[str, Any]:
-        """Extract page metadata"""
-        metadata = {}
-        
-       
-        meta_tags = soup.find_all('meta')
-        for tag in meta_tags:
-            name = tag.get('name') or tag.get('property')
-            content = tag.get('content')
-            if name and content:
-                metadata[name] = content
-        
-       
-        date_selectors = [
-            'time[datetime]', '.published', '.date', '.post-date',
-            '[datetime]', '.timestamp'
-        ]
-        
-        for selector in date_selectors:
-            date_element = soup.select_one(selector)
-            if date_element:
-                date_value = (
-                    date_element.get('datetime') or 
-                    date_element.get('content') or 
-                    date_element.get_text().strip()
-                )
-                if date_value:
-                    metadata['publish_date'] = date_value
-                    break
-        
-        return metadata
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class InstrumentedExecutor:
+    """Thread pool that keeps blocking model calls off the event loop and records queue stats"""
+
+    def __init__(self, name: str, max_workers: int = 1):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+        self._recent_waits = deque(maxlen=1024)
+
+    def start(self):
+        """Create the underlying thread pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=f"{self.name}-worker"
+            )
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable in the pool and await its result"""
+        if self._executor is None:
+            self.start()
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            wait = started_at - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                self._recent_waits.append(wait)
+
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._total_run += time.perf_counter() - started_at
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+        with self._lock:
+            self._queued += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queued)
+
+        try:
+            future = self._executor.submit(task)
+        except RuntimeError:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A task cancelled before a worker picked it up never runs, so
+            # it has to leave the queue count here.
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def backlog(self) -> int:
+        """Number of tasks queued or running"""
+        with self._lock:
+            return self._queued + self._running
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and wait/run time statistics"""
+        with self._lock:
+            finished = self._completed + self._failed
+            started = finished + self._running
+            waits = sorted(self._recent_waits)
+            p95_wait = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+
+            return {
+                'workers': self.max_workers,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'max_queue_depth': self._max_queue_depth,
+                'completed': self._completed,
+                'failed': self._failed,
+                'avg_wait_ms': (self._total_wait / started * 1000) if started else 0.0,
+                'p95_wait_ms': p95_wait * 1000,
+                'max_wait_ms': self._max_wait * 1000,
+                'avg_run_ms': (self._total_run / finished * 1000) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        """Stop the pool, dropping tasks that have not started yet"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,5 +1,5 @@
 import asyncio
-from typing import Any, Callable, TypeVar
+from typing import Any, Callable, Dict, List, TypeVar
 from functools import wraps
 
 T = TypeVar('T')
@@ -37,3 +37,23 @@ def clean_html_text(text: str) -> str:
    
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """Fuse ranked result lists by reciprocal rank, keyed on document id"""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Dict[str, Any]] = {}
+
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc.get('id') or doc.get('content', '')
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            # Earlier lists win, so vector hits keep their certainty/distance.
+            documents.setdefault(key, doc)
+
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True):
+        doc = dict(documents[key])
+        doc['rrf_score'] = scores[key]
+        fused.append(doc)
+    return fused
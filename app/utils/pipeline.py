@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+_END = object()
+
+
+class PipelineStage:
+    """One stage of a streaming pipeline
+
+    Workers take up to ``batch_size`` items that are already waiting in the
+    stage's input queue and pass them to ``process``; whatever it returns is
+    forwarded to the next stage one item at a time.
+    """
+
+    def __init__(self,
+                 name: str,
+                 process: Callable[[List[Any]], Awaitable[Optional[List[Any]]]],
+                 batch_size: int = 1,
+                 concurrency: int = 1):
+        self.name = name
+        self.process = process
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+        self.items = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.max_queue_depth = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def stats(self) -> Dict[str, Any]:
+        wall = ((self.finished_at or time.perf_counter()) - self.started_at) if self.started_at else 0.0
+        return {
+            'items': self.items,
+            'batches': self.batches,
+            'busy_seconds': self.busy,
+            'wall_seconds': wall,
+            'items_per_second': self.items / wall if wall > 0 else 0.0,
+            'max_queue_depth': self.max_queue_depth
+        }
+
+
+class StreamingPipeline:
+    """Runs stages concurrently, connected by bounded queues
+
+    A full queue blocks the stage feeding it, so at most ``queue_size``
+    items wait between two stages and memory stays flat however large the
+    input is. Stages overlap: while one batch is being written the next is
+    already being embedded. The first failure cancels the whole pipeline.
+    """
+
+    def __init__(self, stages: List[PipelineStage], queue_size: int = 256):
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.source_items = 0
+
+    async def run(self, source: AsyncIterator[Any]) -> Dict[str, Dict[str, Any]]:
+        """Feed ``source`` through every stage; returns per-stage stats"""
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        tasks = [asyncio.create_task(self._feed(source, queues[0]))]
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            remaining = [stage.concurrency]
+            tasks.extend(
+                asyncio.create_task(self._work(stage, queues[i], outbox, remaining))
+                for _ in range(stage.concurrency)
+            )
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    async def _feed(self, source: AsyncIterator[Any], inbox: asyncio.Queue):
+        try:
+            async for item in source:
+                self.source_items += 1
+                await inbox.put(item)
+        finally:
+            if hasattr(source, 'aclose'):
+                await source.aclose()
+        await inbox.put(_END)
+
+    async def _work(self,
+                    stage: PipelineStage,
+                    inbox: asyncio.Queue,
+                    outbox: Optional[asyncio.Queue],
+                    remaining: List[int]):
+        done = False
+        while not done:
+            item = await inbox.get()
+            if item is _END:
+                break
+
+            batch = [item]
+            while len(batch) < stage.batch_size and not inbox.empty():
+                item = inbox.get_nowait()
+                if item is _END:
+                    done = True
+                    break
+                batch.append(item)
+
+            stage.max_queue_depth = max(stage.max_queue_depth, inbox.qsize() + len(batch))
+            if stage.started_at is None:
+                stage.started_at = time.perf_counter()
+
+            began = time.perf_counter()
+            results = await stage.process(batch)
+            stage.busy += time.perf_counter() - began
+            stage.items += len(batch)
+            stage.batches += 1
+            stage.finished_at = time.perf_counter()
+
+            if outbox is not None:
+                for result in results or ():
+                    await outbox.put(result)
+
+        # Leave the end marker for the stage's other workers; the last one
+        # to stop passes it downstream.
+        inbox.put_nowait(_END)
+        remaining[0] -= 1
+        if remaining[0] == 0 and outbox is not None:
+            await outbox.put(_END)
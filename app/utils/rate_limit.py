@@ -0,0 +1,54 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+from urllib.parse import urlsplit
+
+
+class _HostSlot:
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+        self.requests = 0
+        self.waited = 0.0
+
+
+class HostRateLimiter:
+    """Caps concurrent requests and spaces request starts per host
+
+    Each host gets its own semaphore and minimum interval between request
+    starts, so a slow or strict host never holds back requests to others.
+    """
+
+    def __init__(self, concurrency: int = 2, delay: float = 1.0):
+        self.concurrency = max(1, concurrency)
+        self.delay = max(0.0, delay)
+        self._hosts: Dict[str, _HostSlot] = {}
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    @asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[None]:
+        """Hold one of the host's request slots for the duration of the block"""
+        slot = self._hosts.get(self.host(url))
+        if slot is None:
+            slot = self._hosts.setdefault(self.host(url), _HostSlot(self.concurrency))
+
+        async with slot.semaphore:
+            loop = asyncio.get_running_loop()
+            async with slot.lock:
+                wait = slot.next_start - loop.time()
+                if wait > 0:
+                    slot.waited += wait
+                    await asyncio.sleep(wait)
+                slot.next_start = loop.time() + self.delay
+                slot.requests += 1
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            host: {'requests': slot.requests, 'waited': slot.waited}
+            for host, slot in self._hosts.items()
+        }
@@ -0,0 +1,95 @@
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from app.core.logging import setup_logging
+
+logger = setup_logging()
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+DISABLED = "disabled"
+FAILED = "failed"
+
+
+class ComponentStatus:
+    """Startup stage and timing of one component"""
+
+    def __init__(self, name: str, required: bool = True):
+        self.name = name
+        self.required = required
+        self.stage = PENDING
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.stage == READY
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return {
+            'stage': self.stage,
+            'ready': self.ready,
+            'required': self.required,
+            'elapsed': elapsed,
+            'error': self.error
+        }
+
+
+class ReadinessRegistry:
+    """Tracks the startup stage of each component so health checks can report it"""
+
+    def __init__(self):
+        self.components: Dict[str, ComponentStatus] = {}
+
+    def register(self, name: str, required: bool = True) -> ComponentStatus:
+        component = ComponentStatus(name, required)
+        self.components[name] = component
+        return component
+
+    def set_stage(self, name: str, stage: str):
+        component = self.components[name]
+        component.stage = stage
+        if component.started_at is None:
+            component.started_at = time.perf_counter()
+        logger.info(f"Component {name}: {stage}")
+
+    async def run(self, name: str, step: Awaitable[Any], stage: str = LOADING) -> Any:
+        """Await one startup step of a component, recording its stage and any failure"""
+        self.set_stage(name, stage)
+        try:
+            return await step
+        except Exception as e:
+            component = self.components[name]
+            component.stage = FAILED
+            component.error = str(e)
+            component.finished_at = time.perf_counter()
+            logger.error(f"Component {name} failed to start: {e}")
+            raise
+
+    def mark_ready(self, name: str):
+        component = self.components[name]
+        component.stage = READY
+        component.finished_at = time.perf_counter()
+        logger.info(f"Component {name} ready in {component.to_dict()['elapsed']:.1f}s")
+
+    def mark_disabled(self, name: str):
+        component = self.components[name]
+        component.stage = DISABLED
+        component.finished_at = time.perf_counter()
+        logger.info(f"Component {name} disabled")
+
+    def is_ready(self, name: str) -> bool:
+        component = self.components.get(name)
+        return component is not None and component.ready
+
+    def failed(self) -> bool:
+        return any(c.stage == FAILED for c in self.components.values() if c.required)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: component.to_dict() for name, component in self.components.items()}
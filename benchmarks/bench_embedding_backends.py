@@ -0,0 +1,111 @@
+"""Measure embedding throughput per backend and check parity with PyTorch
+
+Every backend encodes the same fixed corpus of ITSM-style chunks. Vectors
+are compared row by row with the float32 PyTorch baseline and the run
+fails if any backend drops below the cosine similarity threshold.
+
+Usage: python -m benchmarks.bench_embedding_backends [--backends torch int8 onnx] [--onnx-file onnx/model_qint8_avx2.onnx]
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_backends import EMBEDDING_BACKENDS, load_embedding_model
+
+TOOLS = ["ServiceNow", "Jira Service Management", "Freshservice", "Zendesk", "ManageEngine ServiceDesk Plus",
+         "BMC Helix", "SolarWinds Service Desk", "Ivanti Neurons", "SysAid", "TOPdesk"]
+SECTIONS = {
+    "Overview": "{tool} is an IT service management platform that covers incident, problem and change "
+                "management, with a self-service portal and a configurable workflow engine.",
+    "Key Features": "{tool} offers SLA tracking, automated ticket routing, an asset and configuration "
+                    "database, and integrations with Slack, Microsoft Teams and monitoring tools.",
+    "Pricing": "{tool} pricing starts at a per-agent monthly fee billed annually, with higher tiers "
+               "adding change management, asset discovery and advanced analytics.",
+    "Pros": "Teams praise {tool} for its fast setup, clear reporting dashboards and a large library "
+            "of ready-made workflows for common ITIL processes.",
+    "Cons": "Some reviewers find {tool} expensive at scale and note that deep customization needs "
+            "scripting skills and admin training.",
+}
+QUERIES = [
+    "How much does {tool} cost?",
+    "What are the main features of {tool}?",
+    "Is {tool} a good fit for small IT teams?",
+]
+
+
+def build_corpus(repeat: int):
+    chunks = [
+        f"{tool} - {section}: {template.format(tool=tool)}"
+        for tool, (section, template) in itertools.product(TOOLS, SECTIONS.items())
+    ]
+    queries = [query.format(tool=tool) for tool, query in itertools.product(TOOLS, QUERIES)]
+    return chunks * repeat, queries
+
+
+def measure(model, chunks, queries, batch_size: int):
+    model.encode(chunks[:batch_size], batch_size=batch_size, show_progress_bar=False)
+
+    began = time.perf_counter()
+    vectors = model.encode(chunks, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+    batch_time = time.perf_counter() - began
+
+    latencies = []
+    for query in queries:
+        began = time.perf_counter()
+        model.encode([query], show_progress_bar=False)
+        latencies.append(time.perf_counter() - began)
+
+    return vectors, len(chunks) / batch_time, float(np.percentile(latencies, 50) * 1000)
+
+
+def row_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main(backends, batch_size: int, repeat: int, onnx_file, threshold: float):
+    chunks, queries = build_corpus(repeat)
+    print(f"corpus: {len(chunks)} chunks, {len(queries)} queries, model {settings.EMBEDDING_MODEL}")
+
+    baseline = None
+    failures = []
+    print(f"{'backend':>8} {'chunks/s':>9} {'query p50 ms':>13} {'min cos':>8} {'mean cos':>9}")
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        try:
+            model = load_embedding_model(
+                settings.EMBEDDING_MODEL, backend, device="cpu",
+                cache_folder=settings.HF_CACHE_DIR, onnx_file=onnx_file
+            )
+        except Exception as e:
+            print(f"{backend:>8} unavailable: {e}")
+            continue
+
+        vectors, throughput, query_p50 = measure(model, chunks, queries, batch_size)
+        if baseline is None:
+            baseline = vectors
+            min_cos = mean_cos = 1.0
+        else:
+            cosines = row_cosine(baseline, vectors)
+            min_cos, mean_cos = float(cosines.min()), float(cosines.mean())
+            if min_cos <= threshold:
+                failures.append(backend)
+
+        print(f"{backend:>8} {throughput:>9.1f} {query_p50:>13.2f} {min_cos:>8.4f} {mean_cos:>9.4f}")
+
+    if failures:
+        raise SystemExit(f"Parity check failed (cosine <= {threshold}) for: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=8)
+    parser.add_argument("--onnx-file", default=settings.EMBEDDING_ONNX_FILE)
+    parser.add_argument("--threshold", type=float, default=0.99)
+    args = parser.parse_args()
+    main(args.backends, args.batch_size, args.repeat, args.onnx_file, args.threshold)
@@ -0,0 +1,142 @@
+"""Compare the single-pass extraction engine with the previous per-tool extraction
+
+The previous extractor re-serialized the whole page for every tool it found
+and walked nested blocks repeatedly; it is reproduced here as the baseline.
+Pages are read from saved HTML files (``.html`` or ``.html.gz``); without
+arguments a synthetic listicle page with nested blocks is used.
+
+Usage: python -m benchmarks.bench_extraction [pages ...] [--runs 5] [--parsers html.parser lxml]
+"""
+import argparse
+import gzip
+import re
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from app.services.extraction import DATE_SELECTORS, MAIN_CONTENT_SELECTORS, PARSERS, TITLE_SELECTORS, HtmlExtractor
+
+TOOLS = ["ServiceNow", "Jira Service Management", "Freshservice", "Zendesk", "ManageEngine ServiceDesk Plus",
+         "BMC Helix", "SolarWinds Service Desk", "Ivanti Neurons", "SysAid", "TOPdesk"]
+
+
+def synthetic_page(repeat: int = 6) -> str:
+    blocks = []
+    for rank, tool in enumerate(TOOLS, start=1):
+        paragraphs = "".join(
+            f"<div class='card'>\n<p>{tool} helps IT teams run incident, problem and change management "
+            f"with automation and a self-service portal. Paragraph {i}.</p>\n"
+            f"<ul>\n<li>SLA tracking</li>\n<li>Asset management</li>\n<li>Integrations</li>\n</ul>\n</div>\n"
+            for i in range(repeat)
+        )
+        blocks.append(
+            f"<div class='tool'>\n<h2>{rank}. {tool} - ITSM platform</h2>\n{paragraphs}"
+            f"<p>Pricing: starts at ${rank * 10} per agent per month</p>\n<p>Rating: 4.{rank % 10}/5</p>\n</div>\n"
+        )
+    return (
+        "<html><head><title>Top ITSM tools</title><meta name='description' content='ITSM tools'></head>"
+        f"<body><article>\n{''.join(blocks)}</article></body></html>"
+    )
+
+
+def load_pages(paths):
+    pages = []
+    for path in paths:
+        path = Path(path)
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            pages.append((path.name, f.read()))
+    return pages or [("synthetic-small", synthetic_page(2)), ("synthetic-large", synthetic_page(40))]
+
+
+def legacy_extract(html: str):
+    """Title, metadata, sections and tools as the previous ScraperService extracted them"""
+    soup = BeautifulSoup(html, "html.parser")
+    title = next((e.get_text().strip() for e in map(soup.select_one, TITLE_SELECTORS) if e), "")
+    metadata = {t.get("name") or t.get("property"): t.get("content") for t in soup.find_all("meta")}
+    for element in map(soup.select_one, DATE_SELECTORS):
+        if element:
+            metadata["publish_date"] = element.get("datetime") or element.get_text().strip()
+            break
+    content = next((e for e in map(soup.select_one, MAIN_CONTENT_SELECTORS) if e), None) or soup.find("body")
+
+    sections = []
+    current = None
+    for element in content.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "ul", "ol", "div"]):
+        if element.name.startswith("h"):
+            if current and current["content"].strip():
+                sections.append(current)
+            current = {"title": element.get_text().strip(), "content": ""}
+        elif current is not None:
+            text = element.get_text().strip()
+            if len(text) > 10:
+                current["content"] += text + "\n\n"
+    if current and current["content"].strip():
+        sections.append(current)
+
+    tools = []
+    pattern = r'(\d+)\.\s*([A-Za-z][A-Za-z\s&\-]+)(?:\s*[-–]\s*(.+?))?(?=\n|\r|$)'
+    for match in re.finditer(pattern, content.get_text(), re.MULTILINE):
+        rank, name = int(match.group(1)), match.group(2).strip()
+        if len(name) < 3 or rank > 20:
+            continue
+        text = content.get_text().lower()
+        start = text.find(name.lower())
+        details = {"pricing": "", "rating": ""}
+        if start != -1:
+            context = text[max(0, start - 500):min(len(text), start + 2000)]
+            for p in [r'pricing[:\s]*([^\n]{1,100})', r'price[:\s]*([^\n]{1,100})',
+                      r'cost[:\s]*([^\n]{1,100})', r'\$\d+[^\n]{0,50}']:
+                found = re.search(p, context)
+                if found:
+                    details["pricing"] = found.group(0).strip()
+                    break
+            for p in [r'(\d+\.?\d*)/5', r'(\d+\.?\d*)\s*stars?', r'rating[:\s]*(\d+\.?\d*)']:
+                found = re.search(p, context)
+                if found:
+                    details["rating"] = found.group(1)
+                    break
+        tools.append({"rank": rank, "name": name, "details": details})
+
+    return {"title": title, "metadata": metadata, "sections": sections, "tools": tools}
+
+
+def tool_summary(data):
+    return [(t["rank"], t["name"], t["details"]["pricing"], t["details"]["rating"]) for t in data["tools"]]
+
+
+def timed(fn, runs: int) -> float:
+    fn()
+    began = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - began) / runs * 1000
+
+
+def main(paths, runs: int, parsers):
+    pages = load_pages(paths)
+    extractors = {parser: HtmlExtractor(parser) for parser in parsers}
+
+    print(f"{'page':>24} {'KiB':>7} {'legacy ms':>10} " + " ".join(f"{p + ' ms':>16}" for p in parsers) + "  tools match")
+    for name, html in pages:
+        legacy_ms = timed(lambda: legacy_extract(html), runs)
+        timings = []
+        for parser, extractor in extractors.items():
+            if extractor.parser != parser:
+                timings.append(f"{'unavailable':>16}")
+                continue
+            elapsed = timed(lambda: extractor.extract(html, name), runs)
+            timings.append(f"{elapsed:>9.1f} ({legacy_ms / elapsed:>4.1f}x)")
+
+        matches = tool_summary(legacy_extract(html)) == tool_summary(extractors[parsers[0]].extract(html, name))
+        print(f"{name[-24:]:>24} {len(html) / 1024:>7.0f} {legacy_ms:>10.1f} " + " ".join(timings) + f"  {matches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="*")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--parsers", nargs="+", choices=PARSERS, default=list(PARSERS))
+    args = parser.parse_args()
+    main(args.pages, args.runs, args.parsers)
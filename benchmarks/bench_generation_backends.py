@@ -0,0 +1,143 @@
+"""Compare CPU generation backends against the float32 baseline
+
+Each backend runs in its own process so peak RSS is measured per backend.
+Decoding is greedy so answers can be compared token for token.
+
+Usage: python -m benchmarks.bench_generation_backends [--backends torch int8 onnx] [--max-new-tokens 64]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from app.core.config import settings
+from app.services.generation_backends import GENERATION_BACKENDS, load_onnx_model, quantize_int8
+from app.services.generation_service import PROMPT_TEMPLATE, SYSTEM_PROMPT
+
+SAMPLE_CONTEXT = (
+    "Source 1 (ServiceNow - section): ServiceNow ITSM offers incident, problem and change "
+    "management with a configurable workflow engine and a large app store.\n\n"
+    "Source 2 (Freshservice - tool_pricing): Freshservice - Pricing: plans start at $19 per "
+    "agent per month, billed annually."
+)
+SAMPLE_QUESTIONS = [
+    "How much does Freshservice cost?",
+    "Compare ServiceNow and Jira Service Management.",
+    "Which ITSM tool is best for small teams?",
+]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(backend: str):
+    tokenizer = AutoTokenizer.from_pretrained(
+        settings.HF_MODEL_NAME, cache_dir=settings.HF_CACHE_DIR, token=settings.HF_TOKEN
+    )
+    if backend == "onnx":
+        model = load_onnx_model(
+            settings.HF_MODEL_NAME, settings.GENERATION_ONNX_DIR,
+            cache_dir=settings.HF_CACHE_DIR, token=settings.HF_TOKEN
+        )
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            settings.HF_MODEL_NAME, cache_dir=settings.HF_CACHE_DIR,
+            token=settings.HF_TOKEN, torch_dtype=torch.float32, low_cpu_mem_usage=True
+        )
+        if backend == "int8":
+            model = quantize_int8(model)
+    return tokenizer, model
+
+
+def run_backend(backend: str, max_new_tokens: int) -> dict:
+    """Load one backend, decode every sample prompt greedily and report timings"""
+    began = time.perf_counter()
+    tokenizer, model = load(backend)
+    load_time = time.perf_counter() - began
+
+    outputs = []
+    generated = 0
+    decode_time = 0.0
+    for question in SAMPLE_QUESTIONS:
+        prompt = SYSTEM_PROMPT + PROMPT_TEMPLATE.format(context=SAMPLE_CONTEXT, query=question)
+        input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"]
+
+        began = time.perf_counter()
+        with torch.inference_mode():
+            output = model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.pad_token_id or tokenizer.eos_token_id,
+            )
+        decode_time += time.perf_counter() - began
+
+        new_tokens = output[0, input_ids.shape[1]:].tolist()
+        generated += len(new_tokens)
+        outputs.append(new_tokens)
+
+    return {
+        "backend": backend,
+        "load_time": load_time,
+        "tokens_per_second": generated / decode_time if decode_time else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "outputs": outputs,
+    }
+
+
+def token_agreement(baseline, candidate) -> float:
+    """Share of baseline tokens reproduced before the first divergence"""
+    matched = 0
+    for expected, actual in zip(baseline, candidate):
+        if expected != actual:
+            break
+        matched += 1
+    return matched / len(baseline) if baseline else 1.0
+
+
+def main(backends, max_new_tokens: int):
+    results = {}
+    for backend in backends:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_generation_backends",
+             "--worker", backend, "--max-new-tokens", str(max_new_tokens)],
+            capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            print(f"{backend}: failed: {error[-1] if error else completed.returncode}")
+            continue
+        results[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    baseline = results.get("torch")
+    print(f"{'backend':>8} {'load s':>8} {'tok/s':>8} {'peak MB':>9} {'exact':>6} {'agree':>6}")
+    for backend, result in results.items():
+        if baseline:
+            pairs = list(zip(baseline["outputs"], result["outputs"]))
+            exact = sum(a == b for a, b in pairs) / len(pairs)
+            agreement = sum(token_agreement(a, b) for a, b in pairs) / len(pairs)
+        else:
+            exact = agreement = float("nan")
+        print(f"{backend:>8} {result['load_time']:>8.1f} {result['tokens_per_second']:>8.2f} "
+              f"{result['peak_rss_mb']:>9.0f} {exact:>6.2f} {agreement:>6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", choices=GENERATION_BACKENDS, default=list(GENERATION_BACKENDS))
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--worker", choices=GENERATION_BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.max_new_tokens)))
+    else:
+        main(args.backends, args.max_new_tokens)
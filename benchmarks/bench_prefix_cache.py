@@ -0,0 +1,67 @@
+"""Measure prefill time with and without the cached system prompt prefix
+
+Usage: python -m benchmarks.bench_prefix_cache [--runs 5]
+"""
+import argparse
+import asyncio
+import time
+
+import torch
+from transformers import DynamicCache
+
+from app.services.generation_service import generation_service
+
+SAMPLE_CONTEXT = (
+    "Source 1 (ServiceNow - section): ServiceNow ITSM offers incident, problem and change "
+    "management with a configurable workflow engine and a large app store.\n\n"
+    "Source 2 (Freshservice - tool_pricing): Freshservice - Pricing: plans start at $19 per "
+    "agent per month, billed annually."
+)
+SAMPLE_QUESTIONS = [
+    "How much does Freshservice cost?",
+    "Compare ServiceNow and Jira Service Management.",
+    "Which ITSM tool is best for small teams?",
+]
+
+
+def prefill(prompt_ids, use_prefix: bool) -> float:
+    model = generation_service.model
+    cache = DynamicCache()
+    start = 0
+    if use_prefix:
+        cache = DynamicCache.from_legacy_cache(generation_service.prefix_cache)
+        start = len(generation_service.prefix_ids)
+
+    input_ids = torch.tensor([prompt_ids[start:]], device=model.device)
+    began = time.perf_counter()
+    with torch.inference_mode():
+        model(input_ids=input_ids, past_key_values=cache, use_cache=True)
+    return time.perf_counter() - began
+
+
+async def main(runs: int):
+    await generation_service.initialize()
+    if generation_service.prefix_cache is None:
+        raise SystemExit("Prefix cache is not available for this model")
+
+    prompts = [
+        generation_service._encode_prompt(question, SAMPLE_CONTEXT)
+        for question in SAMPLE_QUESTIONS
+    ]
+    prefill(prompts[0], use_prefix=False)
+
+    for label, use_prefix in (("full prefill", False), ("cached prefix", True)):
+        timings = [prefill(ids, use_prefix) for _ in range(runs) for ids in prompts]
+        print(f"{label:>14}: mean {sum(timings) / len(timings) * 1000:.1f} ms "
+              f"over {len(timings)} prompts")
+
+    print(f"prefix tokens: {len(generation_service.prefix_ids)}, "
+          f"mean prompt tokens: {sum(len(ids) for ids in prompts) / len(prompts):.0f}")
+    generation_service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs))
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Settings are read at import time; keep test runs from writing into the
+# working tree before any app module is imported.
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="itsm-rag-tests-"), "app.log"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
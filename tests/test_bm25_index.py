@@ -0,0 +1,65 @@
+import pytest
+
+from app.db.bm25_index import BM25Index
+
+DOCUMENTS = [
+    {'doc_id': "1", 'content': "ServiceNow automates incident management for large IT teams",
+     'source': "https://example.com/a", 'tool_name': "ServiceNow", 'tool_rank': 1},
+    {'doc_id': "2", 'content': "Jira Service Management pricing starts at $20 per agent",
+     'source': "https://example.com/a", 'tool_name': "Jira Service Management", 'tool_rank': 2},
+    {'doc_id': "3", 'content': "Freshservice offers asset management and a self-service portal",
+     'source': "https://example.com/b", 'tool_name': "Freshservice", 'tool_rank': 3},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.build(DOCUMENTS)
+    return index
+
+
+def test_tokenize_drops_stopwords_and_keeps_compound_terms():
+    assert BM25Index.tokenize("What is the pricing of C++ and node.js?") == ["pricing", "c", "node.js"]
+
+
+def test_search_ranks_matching_chunks(index):
+    results = index.search("incident management", limit=3)
+
+    assert [doc['id'] for doc in results][0] == "1"
+    assert {doc['id'] for doc in results} == {"1", "2", "3"}
+    assert results[0]['bm25_score'] > results[1]['bm25_score'] > 0
+    assert results[0]['tool_name'] == "ServiceNow"
+    assert len(index.search("management", limit=2)) == 2
+
+
+def test_search_without_matches_returns_nothing(index, tmp_path):
+    assert index.search("kubernetes") == []
+    assert index.search("the and of") == []
+    assert BM25Index(str(tmp_path / "empty")).search("incident") == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.save()
+
+    loaded = BM25Index(str(tmp_path))
+    assert loaded.load()
+    assert len(loaded) == len(DOCUMENTS)
+    assert loaded.search("pricing agent") == index.search("pricing agent")
+
+
+def test_load_without_files_reports_missing_index(tmp_path):
+    index = BM25Index(str(tmp_path / "missing"))
+
+    assert not index.load()
+    assert not index.is_ready()
+
+
+def test_documents_for_sources_can_rebuild_the_index(index, tmp_path):
+    kept = index.documents_for_sources({"https://example.com/b"})
+    assert [doc['doc_id'] for doc in kept] == ["3"]
+    assert index.documents_for_sources(set()) == []
+
+    rebuilt = BM25Index(str(tmp_path / "rebuilt"))
+    rebuilt.build(kept)
+    assert [doc['id'] for doc in rebuilt.search("portal")] == ["3"]
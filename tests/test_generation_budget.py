@@ -0,0 +1,60 @@
+import pytest
+
+from app.services.generation_budget import (
+    CACHEABLE_REASONS, COMPLETE_REASONS, BudgetController, GenerationBudget
+)
+
+
+def budget(**kwargs):
+    kwargs.setdefault('max_new_tokens', 100)
+    kwargs.setdefault('deadline', float("inf"))
+    kwargs.setdefault('stop_markers', ("[QUESTION]", "[DOCUMENTS]"))
+    return GenerationBudget(**kwargs)
+
+
+def test_check_stops_on_a_marker_before_other_limits():
+    assert budget(max_new_tokens=1).check("Answer [QUESTION]", 5, now=0.0) == 'marker'
+
+
+def test_check_stops_on_length_and_deadline():
+    assert budget(max_new_tokens=10).check("Answer", 10, now=0.0) == 'length'
+    assert budget(deadline=1.0).check("Answer", 3, now=1.0) == 'deadline'
+    assert budget(deadline=1.0).check("Answer", 3, now=0.5) is None
+
+
+def test_check_stops_at_a_sentence_end_after_enough_tokens():
+    sentences = budget(sentence_stop_tokens=20)
+
+    assert sentences.check("A complete sentence.", 19, now=0.0) is None
+    assert sentences.check("A complete sentence.", 20, now=0.0) == 'sentence'
+    assert sentences.check("An unfinished sentence", 30, now=0.0) is None
+    assert budget().check("A complete sentence.", 50, now=0.0) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("The answer. [QUESTION] next", "The answer. "),
+    ("Two [DOCUMENTS] markers [QUESTION]", "Two "),
+    ("Held back [QUEST", "Held back "),
+    ("Held back [", "Held back "),
+    ("Not a marker [Q1]", "Not a marker [Q1]"),
+    ("No markers at all", "No markers at all"),
+])
+def test_trim_cuts_complete_and_partial_markers(text, expected):
+    assert budget().trim(text) == expected
+
+
+def test_trim_is_a_prefix_of_every_later_trim():
+    text = "Answer text [QUESTION] ignored"
+    trims = [budget().trim(text[:end]) for end in range(len(text) + 1)]
+
+    for earlier, later in zip(trims, trims[1:]):
+        assert later.startswith(earlier)
+    assert trims[-1] == "Answer text "
+
+
+def test_sentence_stops_are_complete_and_cacheable_but_fallbacks_are_not_cached():
+    assert not BudgetController.is_truncated('sentence')
+    assert BudgetController.is_truncated('length')
+    assert 'fallback' in COMPLETE_REASONS
+    assert 'fallback' not in CACHEABLE_REASONS
+    assert CACHEABLE_REASONS <= COMPLETE_REASONS
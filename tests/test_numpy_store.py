@@ -0,0 +1,143 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.db.numpy_store import NumpyVectorStore
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def vector(*hot):
+    v = np.zeros(settings.EMBEDDING_DIMENSION, dtype=np.float32)
+    for i in hot:
+        v[i] = 1.0
+    return v.tolist()
+
+
+def document(doc_id, hot, **fields):
+    return {
+        'doc_id': doc_id,
+        'vector': vector(*hot),
+        'content': f"content of {doc_id}",
+        'source': fields.pop('source', "https://example.com/a"),
+        'content_hash': fields.pop('content_hash', f"hash-{doc_id}"),
+        **fields
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    run(store.connect())
+    return store
+
+
+def test_search_ranks_by_cosine_similarity(store):
+    run(store.add_documents([document("a", [0]), document("b", [1]), document("c", [0, 1])]))
+
+    results = run(store.search(vector(0), limit=2))
+
+    assert [doc['id'] for doc in results] == ["a", "c"]
+    assert results[0]['certainty'] == pytest.approx(1.0)
+    assert results[0]['distance'] == pytest.approx(0.0)
+
+
+def test_add_replaces_documents_with_the_same_id(store):
+    run(store.add_documents([document("a", [0]), document("b", [1])]))
+    run(store.add_documents([document("a", [2], content_hash="changed")]))
+
+    assert run(store.get_document_count()) == 2
+    assert run(store.search(vector(2), limit=1))[0]['id'] == "a"
+    assert run(store.get_content_index())["a"] == {
+        'content_hash': "changed", 'source': "https://example.com/a"
+    }
+
+
+def test_search_applies_where_filters(store):
+    run(store.add_documents([
+        document("a", [0], tool_name="ServiceNow", tool_rank=1),
+        document("b", [0, 1], tool_name="Jira Service Management", tool_rank=2),
+        document("c", [1], tool_name="Freshservice", tool_rank=3),
+    ]))
+
+    equal = {"path": ["toolName"], "operator": "Equal", "valueText": "Freshservice"}
+    assert [doc['id'] for doc in run(store.search(vector(0), 5, equal))] == ["c"]
+
+    ranked = {"operator": "And", "operands": [
+        {"path": ["toolRank"], "operator": "LessThanEqual", "valueInt": 2},
+        {"path": ["toolName"], "operator": "Like", "valueText": "*service *"},
+    ]}
+    assert [doc['id'] for doc in run(store.search(vector(0), 5, ranked))] == ["b"]
+
+    missing = {"path": ["toolName"], "operator": "Equal", "valueText": "Zendesk"}
+    assert run(store.search(vector(0), 5, missing)) == []
+
+
+def test_unsupported_filter_operator_returns_no_results(store):
+    run(store.add_documents([document("a", [0])]))
+
+    assert run(store.search(vector(0), 5, {"path": ["toolName"], "operator": "WithinGeoRange"})) == []
+
+
+def test_delete_documents_keeps_positions_consistent(store):
+    run(store.add_documents([document(name, [i]) for i, name in enumerate("abcd")]))
+
+    run(store.delete_documents(["b", "missing"]))
+
+    assert run(store.get_document_count()) == 3
+    assert set(run(store.get_content_index())) == {"a", "c", "d"}
+    assert run(store.search(vector(3), limit=1))[0]['id'] == "d"
+
+    run(store.delete_all_documents())
+    assert run(store.get_document_count()) == 0
+    assert run(store.search(vector(0))) == []
+
+
+def test_writes_are_persisted_on_flush(tmp_path, store):
+    run(store.add_documents([document("a", [0]), document("b", [1])]))
+
+    unflushed = NumpyVectorStore(str(tmp_path))
+    run(unflushed.connect())
+    assert run(unflushed.get_document_count()) == 0
+
+    run(store.flush())
+    reloaded = NumpyVectorStore(str(tmp_path))
+    run(reloaded.connect())
+    assert run(reloaded.get_content_index()) == run(store.get_content_index())
+    assert run(reloaded.search(vector(1), limit=1))[0]['id'] == "b"
+
+
+def test_reloaded_store_accepts_writes_and_close_flushes(tmp_path, store):
+    run(store.add_documents([document("a", [0])]))
+    run(store.close())
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    run(reloaded.connect())
+    run(reloaded.add_documents([document("a", [1]), document("b", [2])]))
+    run(reloaded.close())
+
+    final = NumpyVectorStore(str(tmp_path))
+    run(final.connect())
+    assert run(final.get_document_count()) == 2
+    assert run(final.search(vector(1), limit=1))[0]['id'] == "a"
+
+
+def test_update_during_flush_does_not_change_the_saved_snapshot(tmp_path, store):
+    run(store.add_documents([document("a", [0]), document("b", [1])]))
+
+    async def flush_while_updating():
+        flushing = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)
+        await store.add_documents([document("a", [2])])
+        await flushing
+
+    run(flush_while_updating())
+
+    saved = NumpyVectorStore(str(tmp_path))
+    run(saved.connect())
+    assert run(saved.search(vector(0), limit=1))[0]['id'] == "a"
+    assert run(store.search(vector(2), limit=1))[0]['id'] == "a"
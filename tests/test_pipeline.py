@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.utils.pipeline import PipelineStage, StreamingPipeline
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def numbers(count):
+    for i in range(count):
+        yield i
+
+
+def test_every_item_reaches_the_last_stage_once():
+    written = []
+
+    async def double(batch):
+        await asyncio.sleep(0)
+        return [item * 2 for item in batch]
+
+    async def write(batch):
+        written.extend(batch)
+
+    pipeline = StreamingPipeline([
+        PipelineStage("double", double, batch_size=3, concurrency=2),
+        PipelineStage("write", write, batch_size=4, concurrency=3),
+    ], queue_size=2)
+
+    stats = run(pipeline.run(numbers(50)))
+
+    assert sorted(written) == [i * 2 for i in range(50)]
+    assert pipeline.source_items == 50
+    assert stats['double']['items'] == 50
+    assert stats['write']['items'] == 50
+    assert stats['write']['max_queue_depth'] <= 2 + 4
+
+
+def test_stages_may_filter_items():
+    written = []
+
+    async def keep_even(batch):
+        return [item for item in batch if item % 2 == 0]
+
+    async def write(batch):
+        written.extend(batch)
+
+    stats = run(StreamingPipeline([
+        PipelineStage("filter", keep_even, batch_size=5),
+        PipelineStage("write", write),
+    ]).run(numbers(10)))
+
+    assert sorted(written) == [0, 2, 4, 6, 8]
+    assert stats['write']['items'] == 5
+
+
+def test_empty_source_finishes():
+    async def write(batch):
+        raise AssertionError("no items expected")
+
+    stats = run(StreamingPipeline([PipelineStage("write", write, concurrency=3)]).run(numbers(0)))
+
+    assert stats['write']['items'] == 0
+
+
+def test_failure_cancels_the_other_stages():
+    cancelled = []
+    closed = []
+
+    async def check(batch):
+        if 3 in batch:
+            raise ValueError("bad item")
+        return batch
+
+    async def stall(batch):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.extend(batch)
+            raise
+
+    async def endless():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.append(True)
+
+    pipeline = StreamingPipeline([
+        PipelineStage("check", check),
+        PipelineStage("stall", stall, concurrency=2),
+    ], queue_size=4)
+
+    with pytest.raises(ValueError, match="bad item"):
+        run(asyncio.wait_for(pipeline.run(endless()), timeout=5))
+
+    assert cancelled == [0, 1]
+    assert closed == [True]
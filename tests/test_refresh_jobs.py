@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from app.services.refresh_jobs import (
+    CANCELLED, COMPLETED, FAILED, QUEUED, RefreshConflict, RefreshJobManager
+)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class Runner:
+    """Refresh runner whose runs finish when the test releases them"""
+
+    def __init__(self, result=None):
+        self.calls = []
+        self.release = asyncio.Event()
+        self.result = result or {'status': 'success'}
+
+    async def __call__(self, **options):
+        self.calls.append(options)
+        options['progress']('scrape', 1, 2)
+        await self.release.wait()
+        return self.result
+
+
+def test_matching_request_joins_the_running_job():
+    async def scenario():
+        runner = Runner()
+        jobs = RefreshJobManager(runner)
+
+        first, first_reused = jobs.submit(force_refresh=True)
+        second, second_reused = jobs.submit(force_refresh=True)
+        runner.release.set()
+        await first.task
+
+        assert second is first
+        assert (first_reused, second_reused) == (False, True)
+        assert first.state == COMPLETED
+        assert len(runner.calls) == 1
+
+    run(scenario())
+
+
+def test_other_options_queue_one_follow_up_job():
+    async def scenario():
+        runner = Runner()
+        jobs = RefreshJobManager(runner)
+
+        running, _ = jobs.submit()
+        queued, reused = jobs.submit(force_refresh=True)
+        joined, joined_reused = jobs.submit(force_refresh=True)
+        await asyncio.sleep(0)
+
+        assert not reused and joined is queued and joined_reused
+        assert queued.state == QUEUED
+        assert len(runner.calls) == 1
+
+        with pytest.raises(RefreshConflict):
+            jobs.submit(replay=True)
+
+        runner.release.set()
+        await queued.task
+
+        assert running.state == COMPLETED and queued.state == COMPLETED
+        assert [call['force_refresh'] for call in runner.calls] == [False, True]
+
+        # With nothing running any more a new request starts right away
+        fresh, reused = jobs.submit(replay=True)
+        await fresh.task
+        assert not reused and fresh.state == COMPLETED
+
+    run(scenario())
+
+
+def test_cancelling_the_queued_job_frees_the_follow_up_slot():
+    async def scenario():
+        runner = Runner()
+        jobs = RefreshJobManager(runner)
+
+        running, _ = jobs.submit()
+        queued, _ = jobs.submit(replay=True)
+        assert (await jobs.cancel(queued.id)).state == CANCELLED
+
+        replacement, reused = jobs.submit(force_refresh=True)
+        assert not reused and replacement is not queued
+
+        runner.release.set()
+        await replacement.task
+        assert running.state == COMPLETED
+        assert [call['replay'] for call in runner.calls] == [False, False]
+
+    run(scenario())
+
+
+def test_cancel_stops_the_running_job_and_starts_the_follow_up():
+    async def scenario():
+        runner = Runner()
+        jobs = RefreshJobManager(runner)
+
+        running, _ = jobs.submit()
+        queued, _ = jobs.submit(force_refresh=True)
+        await asyncio.sleep(0)
+
+        assert (await jobs.cancel(running.id)).state == CANCELLED
+        assert running.stages['scrape']['finished_at'] is not None
+        assert await jobs.cancel("unknown") is None
+
+        runner.release.set()
+        await queued.task
+        assert queued.state == COMPLETED
+        assert jobs.active() is None
+
+    run(scenario())
+
+
+def test_failed_run_records_the_error():
+    async def scenario():
+        runner = Runner({'status': 'error', 'message': "No documents"})
+        runner.release.set()
+        jobs = RefreshJobManager(runner)
+
+        job, _ = jobs.submit()
+        await job.task
+
+        assert job.state == FAILED
+        assert job.to_dict()['error'] == "No documents"
+
+    run(scenario())